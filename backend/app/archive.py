@@ -0,0 +1,213 @@
+"""
+Archivado de filas frías.
+
+Las invitaciones usadas (pasados ARCHIVE_USED_AFTER_DAYS desde su uso) y las
+caducadas sin usar se mueven a invitations_archive, de modo que las tablas
+que consultan las rutas (y sus índices) solo contienen los datos vivos. Con
+ARCHIVE_INACTIVE_PRODUCTS=true (desactivado por defecto) también se mueven a
+products_archive los productos inactivos sin cambios en los últimos
+ARCHIVE_INACTIVE_PRODUCTS_AFTER_DAYS días.
+
+Cada lote es un DELETE ... RETURNING de como mucho ARCHIVE_BATCH_SIZE filas
+seguido del INSERT en el archivo, en la misma transacción. Como el DELETE es
+atómico, varios workers pueden archivar a la vez sin mover dos veces la
+misma fila. El lifespan lanza una pasada cada ARCHIVE_INTERVAL segundos (0
+la desactiva); también se puede ejecutar a mano:
+
+    python -m app.archive
+
+Las filas archivadas son de solo lectura: los listados las incluyen con
+`include_archived=true` y los totales de app/stats.py las siguen contando
+(las invitaciones caducadas pasan a contarse como tales al archivarse). Un
+producto archivado vuelve a la tabla viva con `restore_product`
+(POST /api/products/{id}/restore).
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import changes, search, stats
+from .database import AsyncSessionLocal
+from .metrics import Counter
+from .models import ArchivedInvitation, ArchivedProduct, Invitation, Product
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Lotes por pasada y tabla, para que una pasada no acapare la base de datos
+ARCHIVE_MAX_BATCHES = int(os.getenv("ARCHIVE_MAX_BATCHES", "100"))
+ARCHIVE_USED_AFTER_DAYS = int(os.getenv("ARCHIVE_USED_AFTER_DAYS", "30"))
+ARCHIVE_INACTIVE_PRODUCTS = os.getenv("ARCHIVE_INACTIVE_PRODUCTS", "false").lower() in ("1", "true", "yes")
+ARCHIVE_INACTIVE_PRODUCTS_AFTER_DAYS = int(os.getenv("ARCHIVE_INACTIVE_PRODUCTS_AFTER_DAYS", "90"))
+
+ARCHIVED = Counter("archived_rows_total", "Filas movidas a las tablas de archivo", ("table",))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass(frozen=True)
+class ArchiveSpec:
+    name: str
+    model: type
+    archive_model: type
+    owner: str
+    # Condición de las filas archivables (se evalúa en cada lote por la fecha)
+    condition: Callable
+
+
+def _archivable_invitations():
+    today = date.today()
+    used_before = today - timedelta(days=ARCHIVE_USED_AFTER_DAYS)
+    return (
+        (Invitation.is_used == True) & (Invitation.used_at < used_before)  # noqa: E712
+    ) | (
+        (Invitation.is_used == False) & (Invitation.expires_at < today)  # noqa: E712
+    )
+
+
+def _archivable_products():
+    updated_before = _utcnow() - timedelta(days=ARCHIVE_INACTIVE_PRODUCTS_AFTER_DAYS)
+    return (Product.is_active == False) & (Product.updated_at < updated_before)  # noqa: E712
+
+
+SPECS: List[ArchiveSpec] = [
+    ArchiveSpec("invitations", Invitation, ArchivedInvitation, "sender_id", _archivable_invitations),
+]
+if ARCHIVE_INACTIVE_PRODUCTS:
+    SPECS.append(ArchiveSpec("products", Product, ArchivedProduct, "representative_id", _archivable_products))
+
+
+def _columns(model) -> List[str]:
+    return [column.key for column in model.__table__.columns]
+
+
+async def archive_batch(db: AsyncSession, spec: ArchiveSpec, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Mueve un lote al archivo y hace commit; devuelve las filas movidas"""
+    model, columns = spec.model, _columns(spec.model)
+    batch = select(model.id).where(spec.condition()).limit(batch_size).scalar_subquery()
+    rows = (await db.execute(
+        delete(model).where(model.id.in_(batch))
+        .returning(*[getattr(model, column) for column in columns])
+        .execution_options(synchronize_session=False)
+    )).mappings().all()
+    if not rows:
+        await db.rollback()
+        return 0
+
+    archived_at = _utcnow()
+    await db.execute(insert(spec.archive_model), [{**row, "archived_at": archived_at} for row in rows])
+    if model is Product:
+        await search.remove_products(db, [row["id"] for row in rows])
+    if model is Invitation:
+        # Las sin usar que se archivan son las caducadas: pasan de un total al otro
+        expired: Dict[int, int] = {}
+        for row in rows:
+            if not row["is_used"]:
+                expired[row["sender_id"]] = expired.get(row["sender_id"], 0) + 1
+        for sender_id in sorted(expired):
+            await stats.apply_delta(
+                db, sender_id, invitations_unused=-expired[sender_id], invitations_expired=expired[sender_id]
+            )
+    # Los listados por defecto cambian: se invalidan los ETag de cada dueño y
+    # se le avisa de las filas que salen de ellos
+    archived: Dict[int, List[int]] = {}
+    for row in rows:
+        archived.setdefault(row[spec.owner], []).append(row["id"])
+    for owner_id in sorted(archived):
+        await changes.mark_changed(db, owner_id, spec.name, deleted=archived[owner_id])
+    await db.commit()
+    ARCHIVED.inc(spec.name, amount=len(rows))
+    return len(rows)
+
+
+async def archive_pass(session_factory=AsyncSessionLocal) -> Dict[str, int]:
+    """Archiva por lotes todo lo pendiente (hasta ARCHIVE_MAX_BATCHES lotes por tabla)"""
+    moved = {}
+    for spec in SPECS:
+        moved[spec.name] = 0
+        for _ in range(ARCHIVE_MAX_BATCHES):
+            async with session_factory() as db:
+                count = await archive_batch(db, spec)
+            moved[spec.name] += count
+            if count < ARCHIVE_BATCH_SIZE:
+                break
+            # Cede el turno a las peticiones entre lotes
+            await asyncio.sleep(0)
+    return moved
+
+
+async def restore_product(db: AsyncSession, product_id: int, representative_id: int) -> Optional[dict]:
+    """
+    Devuelve un producto archivado a la tabla de productos y lo devuelve (None
+    si no hay ninguno con ese id y dueño). Queda con la fecha de modificación
+    actual para que no se vuelva a archivar enseguida. No hace commit; los
+    totales no cambian porque ya contaban las filas archivadas.
+    """
+    row = (await db.execute(
+        delete(ArchivedProduct)
+        .where(ArchivedProduct.id == product_id, ArchivedProduct.representative_id == representative_id)
+        .returning(*[getattr(ArchivedProduct, column) for column in _columns(Product)])
+        .execution_options(synchronize_session=False)
+    )).mappings().first()
+    if row is None:
+        return None
+    restored = {**row, "updated_at": _utcnow()}
+    await db.execute(insert(Product), [restored])
+    await search.index_products(db, [restored])
+    return restored
+
+
+def with_archived(model, archive_model, where: Callable):
+    """
+    Columnas (`.c`) de un UNION ALL de la tabla y su archivo, para paginar
+    ambas como una sola. `where(tabla)` devuelve los filtros, que se aplican
+    en cada rama para aprovechar sus índices.
+    """
+    columns = _columns(model)
+    branches = [
+        select(*[getattr(table, column) for column in columns]).where(*where(table))
+        for table in (model, archive_model)
+    ]
+    return union_all(*branches).subquery().c
+
+
+_task: Optional[asyncio.Task] = None
+
+
+async def _loop():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+        try:
+            moved = await archive_pass()
+            if any(moved.values()):
+                logger.info("archive_pass", extra=moved)
+        except Exception:
+            logger.exception("archive_pass_failed")
+
+
+async def start():
+    global _task
+    if ARCHIVE_INTERVAL > 0 and _task is None:
+        _task = asyncio.create_task(_loop())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+
+if __name__ == "__main__":
+    moved = asyncio.run(archive_pass())
+    print(", ".join(f"{name}: {count}" for name, count in moved.items()))
@@ -1,78 +1,135 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from dataclasses import dataclass
+import logging
+import os
+from jose import JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, passwords, revocations, schemas, tokens
+from .cache import CacheBackend, MemoryCacheBackend
 from .database import get_db
 
-# Configuración de seguridad
-SECRET_KEY = "tu_clave_secreta_aqui"  # En producción, usar una clave segura y almacenarla en variables de entorno
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Configuración de seguridad (claves y expiración en `tokens`)
+ACCESS_TOKEN_EXPIRE_MINUTES = tokens.ACCESS_TOKEN_EXPIRE_MINUTES
+create_access_token = tokens.create_access_token
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+pwd_context = passwords.pwd_context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/representatives/token")
 
+# Cache del representante autenticado, para no consultarlo en cada petición.
+# Cada entrada guarda el segundo en que se leyó de la base de datos y se
+# descarta si el representante se revocó después (ver app/revocations.py)
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+
+@dataclass(frozen=True)
+class Principal:
+    """Datos mínimos del representante autenticado"""
+    id: int
+    email: str
+    is_active: bool
+
+    @classmethod
+    def from_representative(cls, representative: models.Representative) -> "Principal":
+        return cls(id=representative.id, email=representative.email, is_active=representative.is_active)
+
+principal_cache: CacheBackend = MemoryCacheBackend(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+def set_principal_cache(backend: CacheBackend):
+    """Reemplaza la cache en memoria por un backend compartido entre workers"""
+    global principal_cache
+    principal_cache = backend
+
+def _principal_key(email: str) -> str:
+    return f"principal:{email}"
+
+async def invalidate_principal(db: AsyncSession, representative_id: int, *emails: str):
+    """
+    Descarta los datos del representante guardados en sus tokens y en la
+    cache de todos los workers; llamar antes del commit de la modificación,
+    que guarda también la revocación. Los tokens emitidos antes de este
+    momento dejan de usar sus claims y vuelven a consultar la base de datos
+    hasta que expiran.
+    """
+    await revocations.revoke(db, representative_id)
+    for email in emails:
+        await principal_cache.delete(_principal_key(email))
+
+# Versiones síncronas para scripts; las rutas usan las de `passwords`, que no bloquean el event loop
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return passwords.verify_password_sync(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def get_representative(db: Session, email: str):
-    return db.query(models.Representative).filter(models.Representative.email == email).first()
-
-def authenticate_representative(db: Session, email: str, password: str):
-    print(f"Buscando representante con email: {email}")
-    representative = get_representative(db, email)
+    return passwords.hash_password_sync(password)
+
+async def get_representative(db: AsyncSession, email: str):
+    result = await db.execute(
+        select(models.Representative).where(models.Representative.email == email)
+    )
+    return result.scalars().first()
+
+async def authenticate_representative(db: AsyncSession, email: str, password: str):
+    representative = await get_representative(db, email)
     if not representative:
-        print("Representante no encontrado")
+        logger.info("login_failed", extra={"email": email, "reason": "unknown_email"})
         return False
-    print("Representante encontrado, verificando contraseña")
-    if not verify_password(password, representative.hashed_password):
-        print("Contraseña incorrecta")
+    verified, new_hash = await passwords.verify_and_update(password, representative.hashed_password)
+    if not verified:
+        logger.info("login_failed", extra={"email": email, "reason": "bad_password"})
         return False
-    print("Autenticación exitosa")
+    if new_hash:
+        # El coste de bcrypt cambió: se guarda el hash recalculado
+        representative.hashed_password = new_hash
+        await db.commit()
+        logger.info("password_rehashed", extra={"representative_id": representative.id})
     return representative
 
+async def deactivate_representative(db: AsyncSession, representative: models.Representative):
+    """Desactiva la cuenta y hace commit; sus tokens dejan de valer para las rutas de cuentas activas"""
+    representative.is_active = False
+    await invalidate_principal(db, representative.id, representative.email)
+    await db.commit()
+
 async def get_current_representative(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> models.Representative:
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = tokens.decode_token(token)
     except JWTError:
         raise credentials_exception
-    
-    representative = get_representative(db, email=email)
+    email: str = payload["sub"]
+
+    # Camino rápido: el token ya trae el id y el estado del representante
+    if "rid" in payload and revocations.is_current(payload["rid"], payload["iat"]):
+        return Principal(id=payload["rid"], email=email, is_active=payload["act"])
+
+    cached = await principal_cache.get(_principal_key(email))
+    if cached is not None:
+        principal, loaded_at = cached
+        if revocations.is_current(principal.id, loaded_at):
+            return principal
+    # El momento de lectura se toma antes de la consulta: una revocación
+    # durante la consulta invalida la entrada
+    loaded_at = revocations.now()
+    representative = await get_representative(db, email=email)
     if representative is None:
         raise credentials_exception
-    return representative
+    principal = Principal.from_representative(representative)
+    await principal_cache.set(_principal_key(email), (principal, loaded_at))
+    return principal
 
 async def get_current_active_representative(
-    current_representative: models.Representative = Depends(get_current_representative)
-) -> models.Representative:
+    current_representative: Principal = Depends(get_current_representative)
+) -> Principal:
     if not current_representative.is_active:
         raise HTTPException(status_code=400, detail="Inactive representative")
     return current_representative
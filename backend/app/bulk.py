@@ -0,0 +1,230 @@
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Tamaño de cada transacción y límite de elementos por petición
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+MAX_BULK_ITEMS = int(os.getenv("MAX_BULK_ITEMS", "10000"))
+
+IndexedItem = Tuple[int, dict]
+
+# Se llama antes del commit de cada bloque con las filas tal como quedan
+# (creadas o modificadas) y como estaban (modificadas o borradas)
+WriteHook = Callable[[AsyncSession, list, list], Awaitable[None]]
+
+
+def check_batch_size(count: int):
+    if count > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {MAX_BULK_ITEMS} elementos por petición"
+        )
+
+
+def chunked(items: Sequence, size: int = BULK_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _error(index: int, detail) -> dict:
+    return {"index": index, "detail": detail}
+
+
+def _db_error(exc: SQLAlchemyError) -> str:
+    return str(getattr(exc, "orig", None) or exc)
+
+
+def validate_items(
+    schema: type[BaseModel],
+    items: Sequence,
+    start: int = 0,
+    exclude_unset: bool = False
+) -> Tuple[List[IndexedItem], List[dict]]:
+    """Valida cada elemento por separado; los inválidos se reportan sin abortar el lote"""
+    valid, errors = [], []
+    for offset, raw in enumerate(items):
+        try:
+            item = schema.model_validate(raw)
+        except ValidationError as exc:
+            errors.append(_error(start + offset, exc.errors(include_url=False, include_context=False)))
+            continue
+        valid.append((start + offset, item.model_dump(exclude_unset=exclude_unset)))
+    return valid, errors
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Divide el cuerpo recibido por bloques en líneas (sin decodificar)"""
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+_INVALID_JSON = object()
+
+
+def _validate_pending(schema: type[BaseModel], pending: List[Tuple[int, object]]):
+    valid, errors = [], []
+    for index, raw in pending:
+        if raw is _INVALID_JSON:
+            errors.append(_error(index, "JSON inválido"))
+            continue
+        item_valid, item_errors = validate_items(schema, [raw], start=index)
+        valid.extend(item_valid)
+        errors.extend(item_errors)
+    return valid, errors
+
+
+async def read_ndjson(
+    stream: AsyncIterator[bytes],
+    schema: type[BaseModel]
+) -> AsyncIterator[Tuple[List[IndexedItem], List[dict]]]:
+    """
+    Lee un cuerpo NDJSON en streaming y entrega bloques validados de
+    BULK_CHUNK_SIZE. Las líneas que no son JSON en UTF-8 se reportan como
+    error. Al pasar de MAX_BULK_ITEMS se deja de leer y el resto se reporta
+    como un error en el último bloque: los anteriores ya se guardaron, así
+    que no se puede responder 413.
+    """
+    pending, overflow, index = [], [], 0
+    async for line in iter_lines(stream):
+        if not line.strip():
+            continue
+        if index >= MAX_BULK_ITEMS:
+            overflow.append(_error(index, f"Máximo {MAX_BULK_ITEMS} elementos por petición; no se procesó el resto"))
+            break
+        try:
+            raw = json.loads(line.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raw = _INVALID_JSON
+        pending.append((index, raw))
+        index += 1
+        if len(pending) >= BULK_CHUNK_SIZE:
+            yield _validate_pending(schema, pending)
+            pending = []
+    if pending or overflow:
+        valid, errors = _validate_pending(schema, pending)
+        yield valid, errors + overflow
+
+
+async def _insert_chunk(db: AsyncSession, model, returning, chunk: List[IndexedItem], on_write: Optional[WriteHook]):
+    result = await db.execute(
+        insert(model).returning(*returning, sort_by_parameter_order=True),
+        [values for _, values in chunk]
+    )
+    rows = result.mappings().all()
+    if on_write and rows:
+        await on_write(db, rows, [])
+    await db.commit()
+    return rows
+
+
+async def bulk_insert(
+    db: AsyncSession,
+    model,
+    items: List[IndexedItem],
+    extra_values: Dict,
+    returning: Sequence,
+    on_write: Optional[WriteHook] = None
+) -> Tuple[list, List[dict]]:
+    """
+    Inserta los elementos con un INSERT ... RETURNING por bloque, cada bloque
+    en su propia transacción. Si un bloque falla se reintenta elemento a
+    elemento para reportar exactamente cuáles fallaron.
+    """
+    created, errors = [], []
+    rows = [(index, {**values, **extra_values}) for index, values in items]
+    for chunk in chunked(rows):
+        try:
+            created.extend(await _insert_chunk(db, model, returning, chunk, on_write))
+        except SQLAlchemyError:
+            await db.rollback()
+            for item in chunk:
+                try:
+                    created.extend(await _insert_chunk(db, model, returning, [item], on_write))
+                except SQLAlchemyError as exc:
+                    await db.rollback()
+                    errors.append(_error(item[0], _db_error(exc)))
+    return created, errors
+
+
+async def bulk_update(
+    db: AsyncSession,
+    model,
+    owner_column,
+    owner_id: int,
+    items: List[IndexedItem],
+    returning: Sequence,
+    on_write: Optional[WriteHook] = None
+) -> Tuple[list, List[dict]]:
+    """Actualiza por id solo los registros que pertenecen a `owner_id`"""
+    updated, errors = [], []
+    for chunk in chunked(items):
+        ids = {values["id"] for _, values in chunk}
+        previous = (await db.execute(
+            select(*returning).where(model.id.in_(ids), owner_column == owner_id).order_by(model.id)
+        )).mappings().all()
+        owned = {row["id"] for row in previous}
+
+        params = []
+        for index, values in chunk:
+            if values["id"] not in owned:
+                errors.append(_error(index, "No encontrado"))
+            elif len(values) > 1:
+                params.append(values)
+        try:
+            if params:
+                await db.execute(update(model), params)
+            rows = []
+            if owned:
+                result = await db.execute(
+                    select(*returning).where(model.id.in_(owned)).order_by(model.id)
+                )
+                rows = result.mappings().all()
+                if on_write and params:
+                    await on_write(db, rows, previous)
+            await db.commit()
+            updated.extend(rows)
+        except SQLAlchemyError as exc:
+            await db.rollback()
+            errors.extend(_error(index, _db_error(exc)) for index, values in chunk if values["id"] in owned)
+    return updated, errors
+
+
+async def bulk_delete(
+    db: AsyncSession,
+    model,
+    owner_column,
+    owner_id: int,
+    ids: List[int],
+    returning: Sequence = (),
+    on_write: Optional[WriteHook] = None
+) -> Tuple[List[int], List[int]]:
+    """
+    Borra por id solo los registros que pertenecen a `owner_id`. Las
+    columnas de `returning` (que deben incluir el id) llegan a `on_write`.
+    """
+    deleted = []
+    for chunk in chunked(list(dict.fromkeys(ids))):
+        result = await db.execute(
+            delete(model)
+            .where(model.id.in_(chunk), owner_column == owner_id)
+            .returning(*(returning or [model.id]))
+        )
+        rows = result.mappings().all()
+        if on_write and rows:
+            await on_write(db, [], rows)
+        await db.commit()
+        deleted.extend(row["id"] for row in rows)
+    found = set(deleted)
+    return deleted, [id_ for id_ in dict.fromkeys(ids) if id_ not in found]
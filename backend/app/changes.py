@@ -0,0 +1,56 @@
+from typing import Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import events, replicas
+from .database import dialect_insert
+from .models import RepresentativeVersion
+
+
+async def mark_changed(
+    db: AsyncSession,
+    representative_id: int,
+    resource: Optional[str] = None,
+    upserted: Sequence = (),
+    deleted: Sequence[int] = (),
+) -> int:
+    """
+    Incrementa la versión de datos del representante y la devuelve. Se llama
+    antes del commit de cualquier escritura sobre sus hijos, productos o
+    invitaciones, para que el cambio de versión sea atómico con el cambio de
+    datos. Durante unos segundos sus lecturas irán al primario (ver
+    app/replicas.py). Con `resource`, las filas escritas (`upserted`) y los
+    ids borrados (`deleted`) se publican como evento al hacer commit (ver
+    app/events.py).
+    """
+    insert = dialect_insert(db)
+    statement = insert(RepresentativeVersion).values(representative_id=representative_id, version=1)
+    version = await db.scalar(statement.on_conflict_do_update(
+        index_elements=[RepresentativeVersion.representative_id],
+        set_={"version": RepresentativeVersion.version + 1},
+    ).returning(RepresentativeVersion.version))
+    await replicas.stick(representative_id)
+    if resource:
+        events.queue_event(db, events.change_event(representative_id, version, resource, upserted, deleted))
+    return version
+
+
+async def current_version(db: AsyncSession, representative_id: int) -> int:
+    version = await db.scalar(
+        select(RepresentativeVersion.version).where(RepresentativeVersion.representative_id == representative_id)
+    )
+    return version or 0
+
+
+def on_write(representative_id: int, resource: Optional[str] = None):
+    """Hook para las operaciones de `bulk`: marca el cambio en cada bloque antes de su commit"""
+    async def hook(db: AsyncSession, rows, previous):
+        await mark_changed(db, representative_id, resource, rows, removed_ids(rows, previous))
+    return hook
+
+
+def removed_ids(rows, previous) -> list:
+    """Ids de `previous` que ya no están en `rows` (filas borradas)"""
+    remaining = {row["id"] for row in rows}
+    return [row["id"] for row in previous if row["id"] not in remaining]
@@ -0,0 +1,129 @@
+from typing import Dict, Optional
+from sqlalchemy import Boolean, Date, Float, Integer, String, cast, literal, null, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+# Columnas genéricas de la consulta UNION ALL. Todas las secciones comparten
+# estas columnas tipadas (las que no usan se rellenan con NULL del mismo tipo,
+# requisito de PostgreSQL para combinar los SELECT).
+SLOTS = {
+    "id": Integer,
+    "owner_id": Integer,
+    "ref_id": Integer,
+    "text1": String,
+    "text2": String,
+    "text3": String,
+    "text4": String,
+    "date1": Date,
+    "date2": Date,
+    "date3": Date,
+    "number": Float,
+    "count": Integer,
+    "flag": Boolean,
+}
+
+# Sección -> (modelo, columna dueña, {campo de respuesta: (columna, slot)})
+SECTIONS = {
+    "representative": (
+        models.Representative,
+        models.Representative.id,
+        {
+            "id": (models.Representative.id, "id"),
+            "full_name": (models.Representative.full_name, "text1"),
+            "country": (models.Representative.country, "text2"),
+            "email": (models.Representative.email, "text3"),
+            "phone": (models.Representative.phone, "text4"),
+            "birth_date": (models.Representative.birth_date, "date1"),
+            "is_active": (models.Representative.is_active, "flag"),
+        },
+    ),
+    "children": (
+        models.Child,
+        models.Child.representative_id,
+        {
+            "id": (models.Child.id, "id"),
+            "representative_id": (models.Child.representative_id, "owner_id"),
+            "full_name": (models.Child.full_name, "text1"),
+            "country": (models.Child.country, "text2"),
+            "birth_date": (models.Child.birth_date, "date1"),
+        },
+    ),
+    "products": (
+        models.Product,
+        models.Product.representative_id,
+        {
+            "id": (models.Product.id, "id"),
+            "representative_id": (models.Product.representative_id, "owner_id"),
+            "name": (models.Product.name, "text1"),
+            "description": (models.Product.description, "text2"),
+            "price": (models.Product.price, "number"),
+            "stock": (models.Product.stock, "count"),
+            "is_active": (models.Product.is_active, "flag"),
+        },
+    ),
+    "invitations": (
+        models.Invitation,
+        models.Invitation.sender_id,
+        {
+            "id": (models.Invitation.id, "id"),
+            "sender_id": (models.Invitation.sender_id, "owner_id"),
+            "redeemed_by_id": (models.Invitation.redeemed_by_id, "ref_id"),
+            "code": (models.Invitation.code, "text1"),
+            "created_at": (models.Invitation.created_at, "date1"),
+            "used_at": (models.Invitation.used_at, "date2"),
+            "expires_at": (models.Invitation.expires_at, "date3"),
+            "is_used": (models.Invitation.is_used, "flag"),
+        },
+    ),
+}
+
+SECTION_NAMES = list(SECTIONS)
+
+
+def _section_select(position: int, name: str, representative_id: int, limit: Optional[int]):
+    model, owner_column, fields = SECTIONS[name]
+    by_slot = {slot: column for column, slot in fields.values()}
+    columns = [literal(position, Integer).label("section")]
+    for slot, type_ in SLOTS.items():
+        column = by_slot.get(slot)
+        columns.append((column if column is not None else cast(null(), type_)).label(slot))
+
+    query = select(*columns).where(owner_column == representative_id).order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    # Se envuelve en subconsulta para que SQLite acepte ORDER BY/LIMIT por sección
+    return select(query.subquery())
+
+
+def build_dashboard_query(representative_id: int, limits: Optional[Dict[str, Optional[int]]] = None):
+    """Construye un único SELECT con todas las secciones del dashboard"""
+    limits = limits or {}
+    query = union_all(*[
+        _section_select(position, name, representative_id, limits.get(name))
+        for position, name in enumerate(SECTION_NAMES)
+    ]).subquery()
+    return select(query).order_by(query.c.section, query.c.id)
+
+
+async def load_dashboard(
+    db: AsyncSession,
+    representative_id: int,
+    limits: Optional[Dict[str, Optional[int]]] = None
+) -> Optional[dict]:
+    """
+    Carga el dashboard completo en una sola ida a la base de datos.
+    Las filas se convierten directamente en diccionarios, sin pasar por
+    objetos ORM ni por el identity map de la sesión.
+    """
+    result = await db.execute(build_dashboard_query(representative_id, limits))
+
+    dashboard = {name: [] for name in SECTION_NAMES}
+    for row in result.mappings():
+        name = SECTION_NAMES[row["section"]]
+        fields = SECTIONS[name][2]
+        dashboard[name].append({field: row[slot] for field, (_, slot) in fields.items()})
+
+    if not dashboard["representative"]:
+        return None
+    dashboard["representative"] = dashboard["representative"][0]
+    return dashboard
@@ -1,7 +1,7 @@
 # backend/app/database.py
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
 import os
 
 # Obtener la URL de la base de datos del entorno
@@ -11,26 +11,114 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cf-incubator.db")
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# Configurar el engine según el entorno
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
+
+def get_async_url(url: str) -> str:
+    """Traduce una URL síncrona al driver asíncrono equivalente"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+# URL usada por la API; se puede forzar con ASYNC_DATABASE_URL (p. ej. para parámetros SSL de asyncpg)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", get_async_url(DATABASE_URL))
+
+# Procesos del servidor (app/server.py lo exporta a los workers)
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Conexiones que puede abrir la aplicación entre todos los workers (0 = sin
+# presupuesto: se usan DB_POOL_SIZE y DB_MAX_OVERFLOW en cada worker). Solo
+# cuenta el pool del engine asíncrono de la API: el síncrono (scripts y
+# migraciones, que se ejecutan antes de arrancar el servidor) y los de las
+# réplicas de lectura (otra base de datos, mismos tamaños por worker) quedan
+# fuera del presupuesto
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+
+
+def pool_sizes(max_connections: int, workers: int) -> tuple:
+    """
+    Reparte el presupuesto entre los workers: (pool_size, max_overflow) de
+    cada uno. Cada worker necesita al menos una conexión, así que con más
+    workers que conexiones falla en lugar de pasarse del presupuesto.
+    """
+    if workers > max_connections:
+        raise ValueError(
+            f"DB_MAX_CONNECTIONS={max_connections} no alcanza para WEB_CONCURRENCY={workers} workers"
+        )
+    per_worker = max_connections // workers
+    pool_size = max(1, per_worker // 2)
+    return pool_size, per_worker - pool_size
+
+
+# Configuración del pool de conexiones
+if DB_MAX_CONNECTIONS:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW = pool_sizes(DB_MAX_CONNECTIONS, WEB_CONCURRENCY)
 else:
-    engine = create_engine(DATABASE_URL)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+def engine_options(url: str) -> dict:
+    """Opciones del engine según el motor de base de datos"""
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if url.startswith("sqlite"):
+        # SQLite no usa un pool con tamaño configurable
+        if "aiosqlite" not in url:
+            options["connect_args"] = {"check_same_thread": False}
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+# Engine síncrono: solo para scripts y migraciones, nunca dentro de las rutas.
+# Los engines no abren conexiones hasta el primer uso; el lifespan de
+# app/main.py las comprueba al arrancar y las cierra al parar
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine asíncrono usado por la API
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
+def dialect_insert(db):
+    """insert() del dialecto en uso, con soporte de ON CONFLICT (PostgreSQL y SQLite)"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+async def dispose_engines():
+    """Cierra las conexiones de ambos pools (parada del worker)"""
+    await async_engine.dispose()
+    engine.dispose()
+
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-# Crear todas las tablas
+# Crear o actualizar las tablas aplicando las migraciones pendientes (scripts y despliegue)
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    from .migrations import upgrade
+    upgrade(engine)
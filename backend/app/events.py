@@ -0,0 +1,200 @@
+"""
+Eventos de cambios por representante (Server-Sent Events).
+
+`changes.mark_changed` deja un ChangeEvent pendiente en la sesión y, al hacer
+commit, se publica en el broker; GET /api/events lo envía a las conexiones
+abiertas del representante. Así un cliente carga los datos una vez y después
+solo aplica los cambios:
+
+    event: change
+    id: 42
+    data: {"resource": "products", "version": 42, "upserted": [{...}], "deleted": [7]}
+
+`id` es la versión de datos (la misma de los ETag). Si un cambio afecta a más
+de EVENTS_MAX_ITEMS filas, o el cliente se queda atrás y se llena su cola
+(EVENTS_QUEUE_SIZE), recibe `event: resync` y debe volver a pedir el recurso
+indicado (o todo, si `resource` es null).
+
+El broker por defecto reparte los eventos dentro del worker. Para repartirlos
+entre workers se puede reemplazar con `set_event_broker` por uno que publique
+en un servicio compartido (p. ej. pub/sub de Redis) y entregue con `deliver`
+lo que reciba.
+"""
+import asyncio
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .metrics import Counter, Gauge
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_MAX_ITEMS = int(os.getenv("EVENTS_MAX_ITEMS", "100"))
+EVENTS_MAX_CONNECTIONS = int(os.getenv("EVENTS_MAX_CONNECTIONS", "1000"))
+EVENTS_MAX_PER_REPRESENTATIVE = int(os.getenv("EVENTS_MAX_PER_REPRESENTATIVE", "5"))
+
+EVENTS_PUBLISHED = Counter("events_published_total", "Eventos de cambios publicados", ("resource",))
+EVENTS_OVERFLOWED = Counter("events_overflowed_total", "Conexiones que se quedaron atrás y recibieron resync")
+
+_PENDING = "pending_events"
+
+
+@dataclass
+class ChangeEvent:
+    representative_id: int
+    version: int
+    resource: Optional[str]
+    upserted: List[dict] = field(default_factory=list)
+    deleted: List[int] = field(default_factory=list)
+    resync: bool = False
+
+    def to_sse(self) -> str:
+        data = asdict(self)
+        del data["representative_id"], data["resync"]
+        name = "resync" if self.resync else "change"
+        if self.resync:
+            del data["upserted"], data["deleted"]
+        return f"event: {name}\nid: {self.version}\ndata: {json.dumps(data, default=_json_default)}\n\n"
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} no es serializable")
+
+
+def change_event(representative_id: int, version: int, resource: str, upserted: Sequence = (), deleted: Sequence[int] = ()) -> ChangeEvent:
+    """Evento de un cambio; sin filas, o con demasiadas, el cliente debe recargar el recurso"""
+    if not upserted and not deleted or len(upserted) + len(deleted) > EVENTS_MAX_ITEMS:
+        return ChangeEvent(representative_id, version, resource, resync=True)
+    return ChangeEvent(representative_id, version, resource, [dict(row) for row in upserted], list(deleted))
+
+
+class TooManyConnections(Exception):
+    def __init__(self, per_representative: bool):
+        self.per_representative = per_representative
+
+
+class Subscription:
+    def __init__(self, representative_id: int, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.representative_id = representative_id
+        self.queue: "asyncio.Queue[Optional[ChangeEvent]]" = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, change: ChangeEvent):
+        try:
+            self.queue.put_nowait(change)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo pendiente y se le pide recargar todo
+            EVENTS_OVERFLOWED.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(ChangeEvent(self.representative_id, change.version, None, resync=True))
+
+    def close(self):
+        """Lo pendiente ya no se enviará: se vacía la cola y se marca el final"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[ChangeEvent]:
+        """Siguiente evento; None cuando el broker cierra la conexión"""
+        return await self.queue.get()
+
+
+class EventBroker:
+    """Interfaz del broker de eventos"""
+
+    def publish(self, change: ChangeEvent):
+        """Publica sin bloquear (se llama desde el commit de la sesión)"""
+        raise NotImplementedError
+
+    def subscribe(self, representative_id: int) -> Subscription:
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription):
+        raise NotImplementedError
+
+    def close(self):
+        """Cierra todas las conexiones (parada del worker)"""
+        raise NotImplementedError
+
+
+class MemoryEventBroker(EventBroker):
+    def __init__(
+        self,
+        max_connections: int = EVENTS_MAX_CONNECTIONS,
+        max_per_representative: int = EVENTS_MAX_PER_REPRESENTATIVE,
+    ):
+        self.max_connections = max_connections
+        self.max_per_representative = max_per_representative
+        self._subscriptions: Dict[int, Set[Subscription]] = {}
+        self._count = 0
+
+    def publish(self, change: ChangeEvent):
+        EVENTS_PUBLISHED.inc(change.resource or "all")
+        self.deliver(change)
+
+    def deliver(self, change: ChangeEvent):
+        """Entrega el evento a las conexiones de este worker"""
+        for subscription in self._subscriptions.get(change.representative_id, ()):
+            subscription.put(change)
+
+    def subscribe(self, representative_id: int) -> Subscription:
+        # Se comprueba antes de crear el conjunto: un rechazo no deja entradas vacías
+        if self._count >= self.max_connections:
+            raise TooManyConnections(per_representative=False)
+        if len(self._subscriptions.get(representative_id, ())) >= self.max_per_representative:
+            raise TooManyConnections(per_representative=True)
+        subscription = Subscription(representative_id)
+        self._subscriptions.setdefault(representative_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscriptions = self._subscriptions.get(subscription.representative_id)
+        if subscriptions and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            self._count -= 1
+            if not subscriptions:
+                del self._subscriptions[subscription.representative_id]
+
+    def close(self):
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.close()
+
+    def connections(self) -> int:
+        return self._count
+
+
+broker: EventBroker = MemoryEventBroker()
+
+EVENTS_CONNECTIONS = Gauge(
+    "events_connections", "Conexiones de eventos abiertas en el worker",
+    function=lambda: broker.connections() if isinstance(broker, MemoryEventBroker) else 0,
+)
+
+
+def set_event_broker(new_broker: EventBroker):
+    global broker
+    broker = new_broker
+
+
+def queue_event(db, change: ChangeEvent):
+    """Deja el evento pendiente hasta el commit de la sesión (síncrona o asíncrona)"""
+    getattr(db, "sync_session", db).info.setdefault(_PENDING, []).append(change)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_pending(session):
+    for change in session.info.pop(_PENDING, ()):
+        broker.publish(change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import TTLCache
+from .changes import current_version
+
+# Cache de respuestas ya serializadas, indexada por ETag
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+_response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+
+# Cabeceras que no se guardan con la respuesta cacheada
+_SKIPPED_HEADERS = {"content-length", "etag", "cache-control"}
+
+
+def make_etag(representative_id: int, version: int, request: Request) -> str:
+    """ETag fuerte: representante, versión de sus datos y URL exacta (ruta y query)"""
+    variant = hashlib.blake2b(str(request.url).encode(), digest_size=8).hexdigest()
+    return f'"{representative_id}-{version}-{variant}"'
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+async def conditional_response(
+    request: Request,
+    db: AsyncSession,
+    representative_id: int,
+    build: Callable[[], Awaitable[Response]]
+) -> Response:
+    """
+    Responde 304 si el cliente ya tiene la versión actual, sin ejecutar
+    `build`. Si no, reutiliza los bytes cacheados para ese ETag o llama a
+    `build` y guarda el resultado.
+    """
+    version = await current_version(db, representative_id)
+    etag = make_etag(representative_id, version, request)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cached = _response_cache.get(etag)
+    if cached is not None:
+        body, media_type, cached_headers = cached
+        return Response(content=body, media_type=media_type, headers={**cached_headers, **headers})
+
+    response = await build()
+    if response.status_code == 200:
+        stored_headers = {
+            key: value for key, value in response.headers.items()
+            if key not in _SKIPPED_HEADERS and key != "content-type"
+        }
+        _response_cache.set(etag, (response.body, response.media_type, stored_headers))
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,375 @@
+"""
+Peticiones idempotentes con la cabecera Idempotency-Key.
+
+Un POST, PUT o PATCH con Idempotency-Key se ejecuta una sola vez: la
+respuesta (estado, cabeceras y cuerpo) se guarda durante IDEMPOTENCY_TTL y
+los reintentos con la misma clave la reciben tal cual, con la cabecera
+Idempotent-Replayed, sin llegar a la ruta. Si el reintento llega mientras la
+primera petición sigue en curso, espera a que termine (hasta
+IDEMPOTENCY_WAIT_TIMEOUT; después responde 409).
+
+- La clave se asocia al representante del token (o, sin token, solo a la
+  clave), así que dos usuarios no comparten respuestas.
+- Reutilizar una clave con otro método, ruta o cuerpo responde 422.
+- Las respuestas 5xx no se guardan: el cliente puede reintentar.
+
+Backends (IDEMPOTENCY_BACKEND):
+- memory: cache en memoria del worker, acotada en tamaño y tiempo. Un
+  reintento atendido por otro worker no la ve, así que solo es el valor por
+  defecto con un único worker.
+- sql: tabla idempotency_keys; la comparten todos los workers. Es el valor
+  por defecto con WEB_CONCURRENCY > 1.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+
+from . import tokens
+from .cache import TTLCache
+from .database import WEB_CONCURRENCY, AsyncSessionLocal, dialect_insert
+from .metrics import Counter
+from .models import IdempotencyKey
+
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", "sql" if WEB_CONCURRENCY > 1 else "memory")
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+# Tiempo que una petición en curso retiene su clave (si el worker muere, se libera al vencer)
+IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", "60"))
+IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.05"))
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "60"))
+# Tamaño máximo del cuerpo de la petición y de la respuesta que se guarda
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", str(1024 * 1024)))
+
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH"}
+MAX_KEY_LENGTH = 255
+
+# Rutas que no deben guardar respuestas (devuelven tokens)
+EXCLUDED_PATHS = {"/api/representatives/token", "/api/representatives/token/refresh"}
+
+# Cabeceras que no se guardan con la respuesta
+_SKIPPED_HEADERS = {b"date", b"server"}
+
+IDEMPOTENT_REQUESTS = Counter(
+    "idempotent_requests_total",
+    "Peticiones con Idempotency-Key por resultado",
+    ("result",),
+)
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+@dataclass
+class IdempotencyRecord:
+    fingerprint: str
+    # None mientras la primera petición está en curso
+    response: Optional[StoredResponse] = None
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class IdempotencyBackend:
+    """
+    Almacén de respuestas. `reserve` guarda la clave de forma atómica y
+    devuelve None si esta petición es la primera, o el registro existente.
+    """
+
+    async def reserve(self, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        raise NotImplementedError
+
+    async def wait(self, key: str, timeout: float) -> Optional[IdempotencyRecord]:
+        """Espera a que la petición en curso termine; None si liberó la clave"""
+        raise NotImplementedError
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        raise NotImplementedError
+
+    async def release(self, key: str):
+        """Libera una clave reservada sin guardar respuesta (error o respuesta 5xx)"""
+        raise NotImplementedError
+
+
+class MemoryIdempotencyBackend(IdempotencyBackend):
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL):
+        self.records = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._done: Dict[str, asyncio.Event] = {}
+
+    async def reserve(self, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        # Sin await en medio: la reserva es atómica dentro del event loop
+        record = self.records.get(key)
+        if record is not None:
+            return record
+        self.records.set(key, IdempotencyRecord(fingerprint), ttl=IDEMPOTENCY_LOCK_TIMEOUT)
+        self._done[key] = asyncio.Event()
+        return None
+
+    async def wait(self, key: str, timeout: float) -> Optional[IdempotencyRecord]:
+        done = self._done.get(key)
+        if done is not None:
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.records.get(key)
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        self.records.set(key, IdempotencyRecord(fingerprint, response))
+        self._finish(key)
+
+    async def release(self, key: str):
+        self.records.delete(key)
+        self._finish(key)
+
+    def _finish(self, key: str):
+        done = self._done.pop(key, None)
+        if done is not None:
+            done.set()
+
+
+class SQLIdempotencyBackend(IdempotencyBackend):
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self._last_purge = 0.0
+
+    async def reserve(self, key: str, fingerprint: str) -> Optional[IdempotencyRecord]:
+        async with self.session_factory() as db:
+            while True:
+                now = _utcnow()
+                await self._purge(db, now)
+                # Una clave caducada (o retenida por un worker que murió) se puede volver a usar
+                await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.expires_at < now))
+                reserved = await db.scalar(
+                    dialect_insert(db)(IdempotencyKey)
+                    .values(
+                        key=key, fingerprint=fingerprint, created_at=now,
+                        expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT),
+                    )
+                    .on_conflict_do_nothing(index_elements=[IdempotencyKey.key])
+                    .returning(IdempotencyKey.key)
+                )
+                await db.commit()
+                if reserved is not None:
+                    return None
+                record = await self._get(db, key)
+                # Si la otra petición liberó la clave entre medias, se vuelve a intentar
+                if record is not None:
+                    return record
+
+    async def _purge(self, db, now: datetime):
+        if time.monotonic() - self._last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+
+    async def _get(self, db, key: str) -> Optional[IdempotencyRecord]:
+        row = (await db.execute(
+            select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.headers, IdempotencyKey.body)
+            .where(IdempotencyKey.key == key)
+        )).first()
+        if row is None:
+            return None
+        if row.status_code is None:
+            return IdempotencyRecord(row.fingerprint)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.headers)]
+        return IdempotencyRecord(row.fingerprint, StoredResponse(row.status_code, headers, row.body))
+
+    async def wait(self, key: str, timeout: float) -> Optional[IdempotencyRecord]:
+        deadline = time.monotonic() + timeout
+        while True:
+            async with self.session_factory() as db:
+                record = await self._get(db, key)
+            if record is None or record.response is not None or time.monotonic() >= deadline:
+                return record
+            await asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL)
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.headers]
+        async with self.session_factory() as db:
+            await db.execute(
+                update(IdempotencyKey).where(IdempotencyKey.key == key).values(
+                    status_code=response.status, headers=json.dumps(headers), body=response.body,
+                    expires_at=_utcnow() + timedelta(seconds=IDEMPOTENCY_TTL),
+                )
+            )
+            await db.commit()
+
+    async def release(self, key: str):
+        async with self.session_factory() as db:
+            await db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+            await db.commit()
+
+
+backend: IdempotencyBackend = SQLIdempotencyBackend() if IDEMPOTENCY_BACKEND == "sql" else MemoryIdempotencyBackend()
+
+
+def set_idempotency_backend(new_backend: IdempotencyBackend):
+    global backend
+    backend = new_backend
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for header, value in scope["headers"]:
+        if header == name:
+            return value.decode("latin-1")
+    return None
+
+
+def request_owner(scope) -> str:
+    """Representante del token; si no se puede leer, un hash de la cabecera Authorization"""
+    authorization = _header(scope, b"authorization")
+    if not authorization:
+        return "anonymous"
+    try:
+        claims = tokens.decode_token(authorization.partition(" ")[2])
+        return f"r{claims.get('rid') or claims['sub']}"
+    except Exception:
+        return "h" + hashlib.blake2b(authorization.encode(), digest_size=16).hexdigest()
+
+
+def fingerprint(scope, body: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1")):
+        digest.update(part.encode() + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def _read_body(receive) -> Optional[bytes]:
+    """Cuerpo completo de la petición, o None si supera IDEMPOTENCY_MAX_BODY"""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > IDEMPOTENCY_MAX_BODY:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+async def _send_json(send, status_code: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, response: StoredResponse):
+    await send({
+        "type": "http.response.start",
+        "status": response.status,
+        "headers": response.headers + [(b"idempotent-replayed", b"true")],
+    })
+    await send({"type": "http.response.body", "body": response.body})
+
+
+class IdempotencyMiddleware:
+    """Middleware ASGI que aplica Idempotency-Key a las rutas que crean o modifican datos"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in IDEMPOTENT_METHODS
+            or scope["path"].rstrip("/") in EXCLUDED_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = _header(scope, b"idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres")
+            return
+
+        body = await _read_body(receive)
+        if body is None:
+            await _send_json(send, 413, "Cuerpo demasiado grande para una petición con Idempotency-Key")
+            return
+        key = f"{request_owner(scope)}:{idempotency_key}"
+        request_fingerprint = fingerprint(scope, body)
+
+        # Segundo intento: la petición en curso puede liberar la clave al fallar
+        for _ in range(2):
+            record = await backend.reserve(key, request_fingerprint)
+            if record is None:
+                await self._execute(scope, receive, send, body, key, request_fingerprint)
+                return
+            if record.fingerprint != request_fingerprint:
+                IDEMPOTENT_REQUESTS.inc("mismatch")
+                await _send_json(send, 422, "Idempotency-Key ya usada con otra petición")
+                return
+            if record.response is None:
+                IDEMPOTENT_REQUESTS.inc("waited")
+                record = await backend.wait(key, IDEMPOTENCY_WAIT_TIMEOUT)
+                if record is None:
+                    continue
+            if record.response is None:
+                break
+            IDEMPOTENT_REQUESTS.inc("replayed")
+            await _replay(send, record.response)
+            return
+
+        IDEMPOTENT_REQUESTS.inc("conflict")
+        await _send_json(send, 409, "Hay una petición con la misma Idempotency-Key en curso")
+
+    async def _execute(self, scope, receive, send, body: bytes, key: str, request_fingerprint: str):
+        """Ejecuta la ruta reenviando la respuesta al cliente y la guarda si es reutilizable"""
+        response = StoredResponse(500, [], b"")
+        storable = True
+        sent = False
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # El cuerpo ya se leyó entero: solo puede llegar la desconexión
+            return await receive()
+
+        async def capture(message):
+            nonlocal storable
+            if message["type"] == "http.response.start":
+                response.status = message["status"]
+                response.headers = [
+                    (name, value) for name, value in message.get("headers", []) if name.lower() not in _SKIPPED_HEADERS
+                ]
+            elif message["type"] == "http.response.body" and storable:
+                response.body += message.get("body", b"")
+                storable = len(response.body) <= IDEMPOTENCY_MAX_BODY
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException:
+            await backend.release(key)
+            raise
+        if storable and response.status < 500:
+            IDEMPOTENT_REQUESTS.inc("stored")
+            await backend.complete(key, request_fingerprint, response)
+        else:
+            await backend.release(key)
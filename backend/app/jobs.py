@@ -0,0 +1,64 @@
+"""
+Tareas diferidas de la aplicación. Se registran al importar el módulo
+(app/main.py lo importa) y se encolan con `tasks.enqueue`.
+"""
+import asyncio
+import logging
+import os
+import smtplib
+from email.message import EmailMessage
+from typing import List, Optional
+
+from . import stats
+from .database import async_engine
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+analytics_logger = logging.getLogger("app.analytics")
+
+# Correo saliente; sin SMTP_HOST los mensajes solo se registran en el log
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM", "no-reply@cf-incubator.app")
+
+
+@task("invitation_used")
+async def invitation_used(invitation_id: int, sender_id: int, redeemed_by: int, used_at: str):
+    """Evento de analítica del canje de una invitación"""
+    analytics_logger.info("invitation_used", extra={
+        "invitation_id": invitation_id,
+        "sender_id": sender_id,
+        "redeemed_by": redeemed_by,
+        "used_at": used_at,
+    })
+
+
+@task("rebuild_stats")
+async def rebuild_stats(representative_ids: Optional[List[int]] = None):
+    """Recalcula la tabla de totales (todos o solo algunos representantes)"""
+    async with async_engine.begin() as connection:
+        await connection.run_sync(stats.rebuild_stats, representative_ids)
+
+
+def _send_email(to: str, subject: str, body: str):
+    message = EmailMessage()
+    message["From"] = SMTP_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as client:
+        client.starttls()
+        if SMTP_USER:
+            client.login(SMTP_USER, SMTP_PASSWORD or "")
+        client.send_message(message)
+
+
+@task("send_email")
+async def send_email(to: str, subject: str, body: str):
+    if not SMTP_HOST:
+        logger.info("email_not_sent", extra={"to": to, "subject": subject, "reason": "SMTP_HOST sin configurar"})
+        return
+    # smtplib es bloqueante: se ejecuta en un hilo
+    await asyncio.to_thread(_send_email, to, subject, body)
@@ -1,17 +1,64 @@
 # backend/app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import representative, child, products, invite
-from .database import create_tables
+from .routes import representative, child, products, invite, export, referrals
+from .routes import events as event_routes
+from .database import async_engine, create_tables, dispose_engines
+from .migrations import check_revision
+from .logging_config import setup_logging
+from .metrics import MetricsMiddleware, instrument_engine, render_metrics
+from . import archive, events, jobs, passwords, query_debug, replicas, revocations, tasks  # noqa: F401 (jobs registra las tareas)
+from .pagination import NEXT_CURSOR_HEADER
+from .responses import app_options
+from .ratelimit import RateLimitMiddleware
+from .idempotency import IdempotencyMiddleware
+import logging
 import os
 
-# Crear las tablas al iniciar
-create_tables()
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+
+# Métricas de consultas SQL (solo registra eventos; no abre conexiones)
+for db_engine in [async_engine, *(replica.engine for replica in replicas.replicas)]:
+    instrument_engine(db_engine)
+    if query_debug.QUERY_DEBUG or query_debug.SLOW_QUERY_MS:
+        query_debug.install(db_engine)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cada worker configura su logging (hilo de escritura) y abre su pool al arrancar
+    setup_logging()
+    # El esquema se migra al desplegar (python -m app.migrations upgrade); al
+    # arrancar solo se comprueba la revisión, salvo con AUTO_MIGRATE (desarrollo)
+    if AUTO_MIGRATE:
+        await run_in_threadpool(create_tables)
+    async with async_engine.connect() as connection:
+        await connection.run_sync(check_revision)
+    await replicas.start()
+    await revocations.start()
+    await tasks.queue.start()
+    await archive.start()
+    try:
+        yield
+    finally:
+        # Termina los flujos de eventos que sigan abiertos (y la conexión del broker, si es compartido)
+        events.broker.close()
+        await archive.stop()
+        # Deja terminar las tareas en curso antes de cerrar los pools
+        await tasks.queue.stop()
+        await revocations.stop()
+        passwords.shutdown_executor()
+        await replicas.stop()
+        await dispose_engines()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="CF Incubator API",
     description="API para el sistema de gestión de CF Incubator",
-    version="1.0.0"
+    version="1.0.0",
+    **app_options()
 )
 
 # Configurar CORS
@@ -22,14 +69,29 @@ origins = [
     "https://*.vercel.app",  # Cualquier subdominio de Vercel
 ]
 
+# Idempotency-Key en las rutas que crean o modifican datos; es el más interno,
+# así que las peticiones rechazadas por los límites no reservan la clave
+app.add_middleware(IdempotencyMiddleware)
+
+# Límites de tasa y de concurrencia; se añade antes que CORS para que los 429/503 lleven sus cabeceras
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Link", "ETag", "Idempotent-Replayed"],
 )
 
+# Presupuesto de consultas por ruta y detección de N+1 (solo con QUERY_DEBUG)
+if query_debug.QUERY_DEBUG:
+    app.add_middleware(query_debug.QueryBudgetMiddleware)
+
+# Métricas por ruta (latencia, peticiones en curso, consultas SQL)
+app.add_middleware(MetricsMiddleware, logger=logging.getLogger("app.access"))
+
 # Ruta raíz
 @app.get("/")
 async def root():
@@ -40,14 +102,21 @@ async def root():
         "status": "online"
     }
 
+# Métricas en formato de texto de Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Incluir rutas
 app.include_router(representative.router, prefix="/api")
 app.include_router(child.router, prefix="/api")
 app.include_router(products.router, prefix="/api")
 app.include_router(invite.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
+app.include_router(referrals.router, prefix="/api")
+app.include_router(event_routes.router, prefix="/api")
 
-# Configuración para Render
+# Servidor con varios workers (ver app/server.py)
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    from .server import main
+    main()
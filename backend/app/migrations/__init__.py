@@ -0,0 +1,170 @@
+"""
+Migraciones del esquema.
+
+Cada revisión es un módulo de app/migrations/versions con `revision`,
+`down_revision`, `description`, `upgrade(connection)` y, opcionalmente,
+`transactional = False` para las que no pueden ejecutarse dentro de una
+transacción (p. ej. CREATE INDEX CONCURRENTLY). Las revisiones aplicadas se
+guardan en la tabla schema_migrations.
+
+    python -m app.migrations upgrade    # aplica las pendientes (al desplegar)
+    python -m app.migrations current    # revisión de la base de datos
+    python -m app.migrations history    # revisiones disponibles
+
+La aplicación no modifica el esquema al arrancar: solo comprueba que la base
+de datos está en la última revisión (`check_revision`). No hay migraciones
+hacia atrás; para deshacer un cambio se escribe una revisión nueva.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+from sqlalchemy.schema import CreateIndex
+
+logger = logging.getLogger(__name__)
+
+# Clave del bloqueo de PostgreSQL que impide aplicar migraciones desde dos procesos a la vez
+ADVISORY_LOCK_KEY = 727_001
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("revision", String, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Revision:
+    revision: str
+    down_revision: Optional[str]
+    description: str
+    upgrade: Callable
+    transactional: bool = True
+
+
+class SchemaOutdated(RuntimeError):
+    """La base de datos no está en la última revisión"""
+
+
+def load_revisions() -> List[Revision]:
+    """Revisiones ordenadas de la primera a la última, comprobando que forman una cadena"""
+    from . import versions
+
+    revisions = []
+    for module_info in sorted(pkgutil.iter_modules(versions.__path__), key=lambda info: info.name):
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        revisions.append(Revision(
+            revision=module.revision,
+            down_revision=module.down_revision,
+            description=module.description,
+            upgrade=module.upgrade,
+            transactional=getattr(module, "transactional", True),
+        ))
+    previous = None
+    for revision in revisions:
+        if revision.down_revision != previous:
+            raise RuntimeError(
+                f"La revisión {revision.revision} sigue a {revision.down_revision}, no a {previous}"
+            )
+        previous = revision.revision
+    return revisions
+
+
+def head() -> Optional[str]:
+    revisions = load_revisions()
+    return revisions[-1].revision if revisions else None
+
+
+def applied_revisions(connection) -> List[str]:
+    if not connection.dialect.has_table(connection, schema_migrations.name):
+        return []
+    return list(connection.execute(select(schema_migrations.c.revision)).scalars())
+
+
+def current_revision(connection) -> Optional[str]:
+    """Última revisión aplicada (None si la base de datos no tiene ninguna)"""
+    applied = set(applied_revisions(connection))
+    current = None
+    for revision in load_revisions():
+        if revision.revision in applied:
+            current = revision.revision
+    return current
+
+
+def check_revision(connection):
+    """Falla si hay revisiones sin aplicar; es la única comprobación del esquema al arrancar"""
+    current, latest = current_revision(connection), head()
+    if current != latest:
+        raise SchemaOutdated(
+            f"La base de datos está en la revisión {current} y la última es {latest}: "
+            "ejecute `python -m app.migrations upgrade`"
+        )
+
+
+def upgrade(engine) -> List[str]:
+    """Aplica las revisiones pendientes en orden y devuelve las aplicadas"""
+    applied_now = []
+    with engine.connect() as lock_connection:
+        if engine.dialect.name == "postgresql":
+            lock_connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            lock_connection.commit()
+        try:
+            with engine.begin() as connection:
+                schema_migrations.create(connection, checkfirst=True)
+                applied = set(applied_revisions(connection))
+            for revision in load_revisions():
+                if revision.revision in applied:
+                    continue
+                logger.info("migration_start", extra={"revision": revision.revision, "description": revision.description})
+                if revision.transactional:
+                    with engine.begin() as connection:
+                        revision.upgrade(connection)
+                        _record(connection, revision)
+                else:
+                    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                        revision.upgrade(connection)
+                    with engine.begin() as connection:
+                        _record(connection, revision)
+                applied_now.append(revision.revision)
+        finally:
+            if engine.dialect.name == "postgresql":
+                lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                lock_connection.commit()
+    return applied_now
+
+
+def _record(connection, revision: Revision):
+    connection.execute(schema_migrations.insert().values(
+        revision=revision.revision,
+        description=revision.description,
+        applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+    ))
+
+
+_CREATE_INDEX = re.compile(r"^CREATE (UNIQUE )?INDEX ")
+
+
+def create_index(connection, index):
+    """
+    Crea un índice del modelo si no existe. En PostgreSQL usa CREATE INDEX
+    CONCURRENTLY, que no bloquea las escrituras de la tabla; necesita una
+    conexión en modo autocommit (revisiones con `transactional = False`).
+    Un índice que quedó inválido por una creación interrumpida se vuelve a crear.
+    """
+    statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=connection.dialect))
+    if connection.dialect.name == "postgresql":
+        invalid = connection.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": index.name}).first()
+        if invalid:
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+        statement = _CREATE_INDEX.sub(lambda match: f"CREATE {match.group(1) or ''}INDEX CONCURRENTLY ", statement)
+    connection.execute(text(statement))
@@ -0,0 +1,27 @@
+import sys
+
+from ..database import engine
+from ..logging_config import setup_logging
+from . import current_revision, head, load_revisions, upgrade
+
+USAGE = "Uso: python -m app.migrations [upgrade | current | history]"
+
+
+def main(argv):
+    command = argv[0] if argv else "upgrade"
+    if command == "upgrade":
+        setup_logging()
+        applied = upgrade(engine)
+        print(f"Revisiones aplicadas: {', '.join(applied)}" if applied else "La base de datos ya está al día")
+    elif command == "current":
+        with engine.connect() as connection:
+            print(f"Actual: {current_revision(connection)} (última: {head()})")
+    elif command == "history":
+        for revision in load_revisions():
+            print(f"{revision.revision}  {revision.description}")
+    else:
+        raise SystemExit(USAGE)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,141 @@
+"""
+Esquema inicial: las tablas que todavía no existan, tal como eran al
+introducir las migraciones.
+
+Sirve tanto para bases de datos nuevas como para las creadas antes de las
+migraciones con `create_all` (solo añade lo que falta). Las tablas se
+definen aquí mismo y no se toman del modelo: una revisión aplicada no debe
+cambiar cuando el modelo cambia; lo nuevo va en revisiones posteriores. En
+SQLite crea y rellena la tabla FTS5 de búsqueda (app/search.py) y, si la
+tabla de totales es nueva, la rellena desde los datos existentes.
+"""
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, func, select,
+)
+
+revision = "0001"
+down_revision = None
+description = "Esquema inicial"
+
+metadata = MetaData()
+
+representatives = Table(
+    "representatives", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("full_name", String, index=True),
+    Column("birth_date", Date),
+    Column("country", String),
+    Column("email", String, unique=True, index=True),
+    Column("phone", String, nullable=True),
+    Column("hashed_password", String),
+    Column("is_active", Boolean),
+)
+
+children = Table(
+    "children", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("full_name", String, index=True),
+    Column("birth_date", Date),
+    Column("country", String),
+    Column("representative_id", Integer, ForeignKey("representatives.id")),
+)
+
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("description", String),
+    Column("price", Float),
+    Column("stock", Integer),
+    Column("is_active", Boolean),
+    Column("representative_id", Integer, ForeignKey("representatives.id")),
+)
+
+invitations = Table(
+    "invitations", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("code", String, unique=True, index=True),
+    Column("is_used", Boolean),
+    Column("created_at", Date),
+    Column("used_at", Date, nullable=True),
+    Column("sender_id", Integer, ForeignKey("representatives.id")),
+)
+
+representative_versions = Table(
+    "representative_versions", metadata,
+    Column("representative_id", Integer, ForeignKey("representatives.id"), primary_key=True),
+    Column("version", Integer, nullable=False, default=0),
+)
+
+representative_stats = Table(
+    "representative_stats", metadata,
+    Column("representative_id", Integer, ForeignKey("representatives.id"), primary_key=True),
+    Column("product_count", Integer, nullable=False, default=0),
+    Column("active_product_count", Integer, nullable=False, default=0),
+    Column("total_spend", Float, nullable=False, default=0.0),
+    Column("children_count", Integer, nullable=False, default=0),
+    Column("invitations_used", Integer, nullable=False, default=0),
+    Column("invitations_unused", Integer, nullable=False, default=0),
+)
+
+task_jobs = Table(
+    "task_jobs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("payload", Text, nullable=False),
+    Column("status", String, nullable=False, default="pending"),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("run_after", DateTime, nullable=False),
+    Column("locked_until", DateTime, nullable=True),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_task_jobs_status_run_after", "status", "run_after"),
+)
+
+# Tabla FTS5 de la búsqueda de productos en SQLite (rowid = id del producto)
+CREATE_PRODUCT_SEARCH = (
+    "CREATE VIRTUAL TABLE product_search USING fts5("
+    "owner, name, description, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+)
+
+
+def _create_product_search(connection):
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+    ).first()
+    if exists:
+        return
+    connection.exec_driver_sql(CREATE_PRODUCT_SEARCH)
+    connection.exec_driver_sql(
+        "INSERT INTO product_search (rowid, owner, name, description) "
+        "SELECT id, 'r' || representative_id, name, description FROM products"
+    )
+
+
+def _fill_stats(connection):
+    def scalar(column, *where):
+        return select(column).where(*where).scalar_subquery()
+
+    representative = representatives.c.id
+    query = select(
+        representative,
+        scalar(func.count(products.c.id), products.c.representative_id == representative),
+        scalar(func.count(products.c.id), products.c.representative_id == representative, products.c.is_active == True),  # noqa: E712
+        scalar(func.coalesce(func.sum(products.c.price * products.c.stock), 0.0), products.c.representative_id == representative),
+        scalar(func.count(children.c.id), children.c.representative_id == representative),
+        scalar(func.count(invitations.c.id), invitations.c.sender_id == representative, invitations.c.is_used == True),  # noqa: E712
+        scalar(func.count(invitations.c.id), invitations.c.sender_id == representative, func.coalesce(invitations.c.is_used, False) == False),  # noqa: E712
+    )
+    columns = [column.name for column in representative_stats.columns]
+    connection.execute(representative_stats.insert().from_select(columns, query))
+
+
+def upgrade(connection):
+    new_stats = not connection.dialect.has_table(connection, representative_stats.name)
+    metadata.create_all(bind=connection)
+    if connection.dialect.name == "sqlite":
+        _create_product_search(connection)
+    # La tabla de totales puede crearse sobre una base de datos con datos
+    if new_stats:
+        _fill_stats(connection)
@@ -0,0 +1,72 @@
+"""
+Índices de las columnas de filtro (representative_id, sender_id) y de
+búsqueda en tablas que ya existían antes de añadirlos al modelo; `create_all`
+no los crea en tablas existentes. En PostgreSQL se crean con CONCURRENTLY
+para no bloquear las escrituras durante el despliegue.
+"""
+from sqlalchemy import Boolean, Column, Index, Integer, MetaData, String, Table, false, text
+
+from app.migrations import create_index
+
+revision = "0002"
+down_revision = "0001"
+description = "Índices de representative_id y sender_id sin bloquear escrituras"
+transactional = False
+
+# Solo las columnas que usan los índices, tal como eran en esta revisión
+metadata = MetaData()
+children = Table(
+    "children", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("representative_id", Integer),
+)
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String),
+    Column("is_active", Boolean),
+    Column("representative_id", Integer),
+)
+invitations = Table(
+    "invitations", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("code", String),
+    Column("is_used", Boolean),
+    Column("sender_id", Integer),
+)
+
+INDEXES = (
+    Index("ix_children_representative_id_id", children.c.representative_id, children.c.id),
+    Index("ix_products_representative_id_id", products.c.representative_id, products.c.id),
+    Index("ix_products_representative_id_name_id", products.c.representative_id, products.c.name, products.c.id),
+    Index("ix_products_representative_id_is_active_id", products.c.representative_id, products.c.is_active, products.c.id),
+    Index("ix_invitations_sender_id_id", invitations.c.sender_id, invitations.c.id),
+    Index(
+        "ix_invitations_unused_code", invitations.c.code,
+        postgresql_where=invitations.c.is_used == false(),
+        sqlite_where=invitations.c.is_used == false(),
+    ),
+)
+
+# Búsqueda de productos; en SQLite la hace la tabla FTS5 creada en 0001. La
+# revisión 0009 sustituye el índice de expresión por una columna generada
+POSTGRESQL_INDEXES = (
+    Index(
+        "ix_products_search_document",
+        text("to_tsvector('simple'::regconfig, coalesce(name, '') || ' ' || coalesce(description, ''))"),
+        _table=products, postgresql_using="gin",
+    ),
+    Index(
+        "ix_products_name_trgm", products.c.name,
+        postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+    ),
+)
+
+
+def upgrade(connection):
+    for index in INDEXES:
+        create_index(connection, index)
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for index in POSTGRESQL_INDEXES:
+            create_index(connection, index)
@@ -0,0 +1,89 @@
+"""
+Caducidad de las invitaciones (invitations.expires_at), tablas de archivo y
+los índices parciales que recorre el archivado (ver app/archive.py). Los
+índices sobre tablas existentes se crean con CONCURRENTLY en PostgreSQL.
+"""
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, false, inspect, text,
+    true,
+)
+
+from app.migrations import create_index
+
+revision = "0003"
+down_revision = "0002"
+description = "Archivo de invitaciones y productos, caducidad de invitaciones"
+transactional = False
+
+metadata = MetaData()
+Table("representatives", metadata, Column("id", Integer, primary_key=True))
+
+ARCHIVE_TABLES = (
+    Table(
+        "products_archive", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String),
+        Column("description", String),
+        Column("price", Float),
+        Column("stock", Integer),
+        Column("is_active", Boolean),
+        Column("representative_id", Integer, ForeignKey("representatives.id")),
+        Column("archived_at", DateTime, nullable=False),
+        Index("ix_products_archive_representative_id_id", "representative_id", "id"),
+    ),
+    Table(
+        "invitations_archive", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("code", String),
+        Column("is_used", Boolean),
+        Column("created_at", Date),
+        Column("used_at", Date, nullable=True),
+        Column("expires_at", Date, nullable=True),
+        Column("sender_id", Integer, ForeignKey("representatives.id")),
+        Column("archived_at", DateTime, nullable=False),
+        Index("ix_invitations_archive_sender_id_id", "sender_id", "id"),
+    ),
+)
+
+# Solo las columnas que usan los índices
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("is_active", Boolean),
+)
+invitations = Table(
+    "invitations", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("is_used", Boolean),
+    Column("used_at", Date),
+    Column("expires_at", Date),
+)
+
+INDEXES = (
+    Index(
+        "ix_products_inactive_id", products.c.id,
+        postgresql_where=products.c.is_active == false(),
+        sqlite_where=products.c.is_active == false(),
+    ),
+    Index(
+        "ix_invitations_used_at", invitations.c.used_at,
+        postgresql_where=invitations.c.is_used == true(),
+        sqlite_where=invitations.c.is_used == true(),
+    ),
+    Index(
+        "ix_invitations_unused_expires_at", invitations.c.expires_at,
+        postgresql_where=invitations.c.is_used == false(),
+        sqlite_where=invitations.c.is_used == false(),
+    ),
+)
+
+
+def upgrade(connection):
+    # Añadir una columna que admite NULL no reescribe la tabla
+    columns = {column["name"] for column in inspect(connection).get_columns("invitations")}
+    if "expires_at" not in columns:
+        connection.execute(text("ALTER TABLE invitations ADD COLUMN expires_at DATE"))
+    for table in ARCHIVE_TABLES:
+        table.create(connection, checkfirst=True)
+    for index in INDEXES:
+        create_index(connection, index)
@@ -0,0 +1,22 @@
+"""Tabla de respuestas guardadas por Idempotency-Key (ver app/idempotency.py)"""
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table, Text
+
+revision = "0004"
+down_revision = "0003"
+description = "Claves de idempotencia"
+
+idempotency_keys = Table(
+    "idempotency_keys", MetaData(),
+    Column("key", String, primary_key=True),
+    Column("fingerprint", String, nullable=False),
+    Column("status_code", Integer, nullable=True),
+    Column("headers", Text, nullable=True),
+    Column("body", LargeBinary, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+    Index("ix_idempotency_keys_expires_at", "expires_at"),
+)
+
+
+def upgrade(connection):
+    idempotency_keys.create(connection, checkfirst=True)
@@ -0,0 +1,67 @@
+"""
+Red de referidos (ver app/referrals.py): quién canjeó cada invitación, tabla
+de clausura referral_paths y totales de referidos con los índices del
+ranking. Los índices sobre tablas existentes se crean con CONCURRENTLY en
+PostgreSQL. Los canjes anteriores no guardaban el representante, así que la
+red empieza vacía.
+"""
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, Table, inspect, text
+
+from app.migrations import create_index
+
+revision = "0005"
+down_revision = "0004"
+description = "Red de referidos"
+transactional = False
+
+# Tabla -> columnas nuevas. Un DEFAULT constante no reescribe la tabla en PostgreSQL 11+
+COLUMNS = {
+    "invitations": {"redeemed_by_id": "INTEGER REFERENCES representatives (id)"},
+    "invitations_archive": {"redeemed_by_id": "INTEGER REFERENCES representatives (id)"},
+    "representative_stats": {
+        "referrals_direct": "INTEGER NOT NULL DEFAULT 0",
+        "referrals_total": "INTEGER NOT NULL DEFAULT 0",
+    },
+}
+
+metadata = MetaData()
+Table("representatives", metadata, Column("id", Integer, primary_key=True))
+
+referral_paths = Table(
+    "referral_paths", metadata,
+    Column("ancestor_id", Integer, ForeignKey("representatives.id"), primary_key=True),
+    Column("descendant_id", Integer, ForeignKey("representatives.id"), primary_key=True),
+    Column("depth", Integer, nullable=False),
+    Index("ix_referral_paths_ancestor_id_depth_descendant_id", "ancestor_id", "depth", "descendant_id"),
+    Index("ix_referral_paths_descendant_id_depth", "descendant_id", "depth"),
+)
+Index(
+    "uq_referral_paths_referrer", referral_paths.c.descendant_id, unique=True,
+    postgresql_where=referral_paths.c.depth == 1,
+    sqlite_where=referral_paths.c.depth == 1,
+)
+
+# Solo las columnas que usan los índices
+representative_stats = Table(
+    "representative_stats", metadata,
+    Column("representative_id", Integer, primary_key=True),
+    Column("referrals_direct", Integer),
+    Column("referrals_total", Integer),
+)
+
+INDEXES = (
+    Index("ix_representative_stats_referrals_total", representative_stats.c.referrals_total, representative_stats.c.representative_id),
+    Index("ix_representative_stats_referrals_direct", representative_stats.c.referrals_direct, representative_stats.c.representative_id),
+)
+
+
+def upgrade(connection):
+    inspector = inspect(connection)
+    for table_name, columns in COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        for name, definition in columns.items():
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {definition}"))
+    referral_paths.create(connection, checkfirst=True)
+    for index in INDEXES:
+        create_index(connection, index)
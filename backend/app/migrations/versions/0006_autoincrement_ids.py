@@ -0,0 +1,117 @@
+"""
+Ids de productos e invitaciones no reutilizables en SQLite.
+
+Sin AUTOINCREMENT, SQLite asigna max(id) + 1, así que el id de una fila
+archivada (ver app/archive.py) podía volver a usarse en la tabla viva y el
+siguiente archivado fallaba por la clave primaria de la tabla de archivo.
+En SQLite las tablas se reconstruyen con AUTOINCREMENT; las filas archivadas
+que ya comparten id con una viva reciben un id nuevo (la viva conserva el
+suyo, que es el que usan los clientes) y la secuencia arranca por encima de
+los ids de ambas tablas. En PostgreSQL las secuencias nunca reutilizan ids.
+"""
+from sqlalchemy import Boolean, Column, Date, Float, ForeignKey, Index, Integer, MetaData, String, Table, false, text, true
+from sqlalchemy.schema import CreateTable
+
+revision = "0006"
+down_revision = "0005"
+description = "Ids de productos e invitaciones no reutilizables (SQLite)"
+
+metadata = MetaData()
+Table("representatives", metadata, Column("id", Integer, primary_key=True))
+
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String),
+    Column("description", String),
+    Column("price", Float),
+    Column("stock", Integer),
+    Column("is_active", Boolean),
+    Column("representative_id", Integer, ForeignKey("representatives.id")),
+    sqlite_autoincrement=True,
+)
+
+invitations = Table(
+    "invitations", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("code", String),
+    Column("is_used", Boolean),
+    Column("created_at", Date),
+    Column("used_at", Date, nullable=True),
+    Column("expires_at", Date, nullable=True),
+    Column("sender_id", Integer, ForeignKey("representatives.id")),
+    Column("redeemed_by_id", Integer, ForeignKey("representatives.id"), nullable=True),
+    sqlite_autoincrement=True,
+)
+
+# Se crean después de borrar la tabla original, que tiene índices con los mismos nombres
+INDEXES = {
+    "products": (
+        Index("ix_products_id", products.c.id),
+        Index("ix_products_name", products.c.name),
+        Index("ix_products_representative_id_id", products.c.representative_id, products.c.id),
+        Index("ix_products_representative_id_name_id", products.c.representative_id, products.c.name, products.c.id),
+        Index("ix_products_representative_id_is_active_id", products.c.representative_id, products.c.is_active, products.c.id),
+        Index("ix_products_inactive_id", products.c.id, sqlite_where=products.c.is_active == false()),
+    ),
+    "invitations": (
+        Index("ix_invitations_id", invitations.c.id),
+        Index("ix_invitations_code", invitations.c.code, unique=True),
+        Index("ix_invitations_sender_id_id", invitations.c.sender_id, invitations.c.id),
+        Index("ix_invitations_unused_code", invitations.c.code, sqlite_where=invitations.c.is_used == false()),
+        Index("ix_invitations_used_at", invitations.c.used_at, sqlite_where=invitations.c.is_used == true()),
+        Index("ix_invitations_unused_expires_at", invitations.c.expires_at, sqlite_where=invitations.c.is_used == false()),
+    ),
+}
+
+TABLES = ((products, "products_archive"), (invitations, "invitations_archive"))
+
+
+def _max_id(connection, table_name: str) -> int:
+    return connection.exec_driver_sql(f"SELECT coalesce(max(id), 0) FROM {table_name}").scalar()
+
+
+def _renumber_archive(connection, table_name: str, archive_name: str):
+    """Da un id nuevo, por encima de ambas tablas, a las filas archivadas que comparten id con una viva"""
+    shared = connection.exec_driver_sql(
+        f"SELECT a.id FROM {archive_name} a JOIN {table_name} t ON t.id = a.id ORDER BY a.id"
+    ).scalars().all()
+    if not shared:
+        return
+    start = max(_max_id(connection, table_name), _max_id(connection, archive_name))
+    connection.execute(
+        text(f"UPDATE {archive_name} SET id = :new WHERE id = :old"),
+        [{"old": old, "new": start + number} for number, old in enumerate(shared, 1)],
+    )
+
+
+def _rebuild(connection, table: Table):
+    # SQLite no puede cambiar la definición de una tabla: se copia a una
+    # nueva y se borra la original (con sus índices)
+    columns = ", ".join(column.name for column in table.columns)
+    connection.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {table.name}_old")
+    connection.execute(CreateTable(table))
+    connection.exec_driver_sql(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old")
+    connection.exec_driver_sql(f"DROP TABLE {table.name}_old")
+    for index in INDEXES[table.name]:
+        index.create(connection)
+
+
+def _set_sequence(connection, table_name: str, archive_name: str):
+    # El siguiente id queda por encima de las filas vivas y de las archivadas
+    last = max(_max_id(connection, table_name), _max_id(connection, archive_name))
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table_name})
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table_name, "seq": last})
+
+
+def upgrade(connection):
+    if connection.dialect.name != "sqlite":
+        return
+    for table, archive_name in TABLES:
+        definition = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        _renumber_archive(connection, table.name, archive_name)
+        if "AUTOINCREMENT" not in definition.upper():
+            _rebuild(connection, table)
+        _set_sequence(connection, table.name, archive_name)
@@ -0,0 +1,50 @@
+"""
+Fecha de modificación de los productos (products.updated_at y su copia en
+products_archive). El archivado de productos inactivos pasa a depender de
+ella, así que el índice parcial de inactivos se indexa por fecha. Los
+inactivos que ya existían toman la fecha de la migración: empiezan a contar
+desde hoy. En PostgreSQL el índice se crea y el anterior se borra con
+CONCURRENTLY.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, MetaData, Table, false, inspect, text
+
+from app.migrations import create_index
+
+revision = "0007"
+down_revision = "0006"
+description = "Fecha de modificación de los productos"
+transactional = False
+
+metadata = MetaData()
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("is_active", Boolean),
+    Column("updated_at", DateTime),
+)
+
+INDEX = Index(
+    "ix_products_inactive_updated_at", products.c.updated_at,
+    postgresql_where=products.c.is_active == false(),
+    sqlite_where=products.c.is_active == false(),
+)
+OLD_INDEX = "ix_products_inactive_id"
+
+
+def upgrade(connection):
+    column_type = DateTime().compile(dialect=connection.dialect)
+    inspector = inspect(connection)
+    for table_name in ("products", "products_archive"):
+        columns = {column["name"] for column in inspector.get_columns(table_name)}
+        if "updated_at" not in columns:
+            connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN updated_at {column_type}"))
+    connection.execute(
+        products.update()
+        .where(products.c.is_active == false(), products.c.updated_at.is_(None))
+        .values(updated_at=datetime.now(timezone.utc).replace(tzinfo=None))
+    )
+    create_index(connection, INDEX)
+    concurrently = " CONCURRENTLY" if connection.dialect.name == "postgresql" else ""
+    connection.execute(text(f"DROP INDEX{concurrently} IF EXISTS {OLD_INDEX}"))
@@ -0,0 +1,20 @@
+"""Revocaciones de los claims de los tokens de acceso (ver app/revocations.py)"""
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, Table
+
+revision = "0008"
+down_revision = "0007"
+description = "Revocaciones de tokens"
+
+metadata = MetaData()
+Table("representatives", metadata, Column("id", Integer, primary_key=True))
+
+token_revocations = Table(
+    "token_revocations", metadata,
+    Column("representative_id", Integer, ForeignKey("representatives.id"), primary_key=True),
+    Column("revoked_at", Integer, nullable=False),
+    Index("ix_token_revocations_revoked_at", "revoked_at"),
+)
+
+
+def upgrade(connection):
+    token_revocations.create(connection, checkfirst=True)
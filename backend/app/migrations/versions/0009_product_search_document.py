@@ -0,0 +1,45 @@
+"""
+Documento de búsqueda de productos en PostgreSQL como columna generada.
+
+El índice de 0002 era sobre una expresión, así que ts_rank volvía a
+calcular to_tsvector en cada fila candidata. La columna `search_document`
+se guarda con la fila (nombre con peso A, descripción con peso B) y se
+indexa con GIN; el índice de expresión se borra. Añadir la columna
+reescribe la tabla de productos; los índices se crean y borran con
+CONCURRENTLY. En SQLite no hace nada: la búsqueda usa la tabla FTS5.
+"""
+from sqlalchemy import Column, Index, Integer, MetaData, Table, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from app.migrations import create_index
+
+revision = "0009"
+down_revision = "0008"
+description = "Documento de búsqueda de productos (PostgreSQL)"
+transactional = False
+
+DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'B')"
+)
+
+metadata = MetaData()
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("search_document", TSVECTOR),
+)
+
+INDEX = Index("ix_products_search_vector", products.c.search_document, postgresql_using="gin")
+OLD_INDEX = "ix_products_search_document"
+
+
+def upgrade(connection):
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(text(
+        f"ALTER TABLE products ADD COLUMN IF NOT EXISTS search_document tsvector "
+        f"GENERATED ALWAYS AS ({DOCUMENT}) STORED"
+    ))
+    create_index(connection, INDEX)
+    connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {OLD_INDEX}"))
@@ -0,0 +1,76 @@
+"""
+Códigos de invitación únicos también frente al archivo y totales de
+invitaciones caducadas (ver app/archive.py y app/stats.py).
+
+Índice sobre invitations_archive.code para comprobar que un código nuevo no
+está ya archivado (con CONCURRENTLY en PostgreSQL) y columna
+representative_stats.invitations_expired. Los totales de invitaciones sin
+usar y caducadas se vuelven a contar desde ambas tablas: las sin usar ya no
+incluyen las caducadas.
+"""
+from datetime import date
+
+from sqlalchemy import Boolean, Column, Date, Index, Integer, MetaData, String, Table, false, func, inspect, select, text, union_all
+
+from app.migrations import create_index
+
+revision = "0010"
+down_revision = "0009"
+description = "Códigos de invitación frente al archivo, invitaciones caducadas"
+transactional = False
+
+metadata = MetaData()
+
+# Solo las columnas que se usan
+invitations = Table(
+    "invitations", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("is_used", Boolean),
+    Column("expires_at", Date),
+    Column("sender_id", Integer),
+)
+invitations_archive = Table(
+    "invitations_archive", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("code", String),
+    Column("is_used", Boolean),
+    Column("expires_at", Date),
+    Column("sender_id", Integer),
+)
+representative_stats = Table(
+    "representative_stats", metadata,
+    Column("representative_id", Integer, primary_key=True),
+    Column("invitations_unused", Integer),
+    Column("invitations_expired", Integer),
+)
+
+INDEX = Index("ix_invitations_archive_code", invitations_archive.c.code)
+
+
+def _recount(connection):
+    today = date.today()
+    unused = union_all(*[
+        select(table.c.sender_id, table.c.expires_at).where(func.coalesce(table.c.is_used, False) == false())
+        for table in (invitations, invitations_archive)
+    ]).subquery()
+
+    def count(*where):
+        return (
+            select(func.count())
+            .where(unused.c.sender_id == representative_stats.c.representative_id, *where)
+            .scalar_subquery()
+        )
+
+    expired = unused.c.expires_at < today
+    connection.execute(representative_stats.update().values(
+        invitations_unused=count(unused.c.expires_at.is_(None) | ~expired),
+        invitations_expired=count(expired),
+    ))
+
+
+def upgrade(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("representative_stats")}
+    if "invitations_expired" not in columns:
+        connection.execute(text("ALTER TABLE representative_stats ADD COLUMN invitations_expired INTEGER NOT NULL DEFAULT 0"))
+    create_index(connection, INDEX)
+    _recount(connection)
@@ -0,0 +1 @@
+# Revisiones del esquema, una por módulo; se aplican en orden de nombre
@@ -1,7 +1,13 @@
-from sqlalchemy import Boolean, Column, Integer, String, Float, ForeignKey, Date
+from sqlalchemy import Boolean, Column, Integer, LargeBinary, String, Float, ForeignKey, Date, DateTime, Index, Text, false, text, true
 from sqlalchemy.orm import relationship
+from datetime import datetime, timezone
 from .database import Base
 
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class Representative(Base):
     __tablename__ = "representatives"
 
@@ -17,7 +23,7 @@ class Representative(Base):
     # Relaciones
     children = relationship("Child", back_populates="representative")
     products = relationship("Product", back_populates="owner")
-    invitations = relationship("Invitation", back_populates="sender")
+    invitations = relationship("Invitation", back_populates="sender", foreign_keys="Invitation.sender_id")
 
 class Child(Base):
     __tablename__ = "children"
@@ -31,6 +37,11 @@ class Child(Base):
     # Relación con el representante
     representative = relationship("Representative", back_populates="children")
 
+    # Índices para la paginación por cursor de cada representante
+    __table_args__ = (
+        Index("ix_children_representative_id_id", "representative_id", "id"),
+    )
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -41,10 +52,40 @@ class Product(Base):
     stock = Column(Integer)
     is_active = Column(Boolean, default=True)
     representative_id = Column(Integer, ForeignKey("representatives.id"))
+    # Última modificación; el archivado solo mueve los inactivos que llevan
+    # tiempo sin cambios
+    updated_at = Column(DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
     
     # Relación con el representante que compró el producto
     owner = relationship("Representative", back_populates="products")
 
+    # Índices para la paginación por cursor, el orden por nombre y el filtro por
+    # estado, y uno parcial con los inactivos por fecha de modificación que
+    # recorre el archivado; en PostgreSQL, además, los de búsqueda: texto
+    # completo sobre la columna generada `search_document` (migración 0009,
+    # no se mapea porque en SQLite no existe) y trigramas. En SQLite la
+    # búsqueda usa la tabla FTS5 de app/search.py
+    __table_args__ = (
+        Index("ix_products_representative_id_id", "representative_id", "id"),
+        Index("ix_products_representative_id_name_id", "representative_id", "name", "id"),
+        Index("ix_products_representative_id_is_active_id", "representative_id", "is_active", "id"),
+        Index(
+            "ix_products_inactive_updated_at", "updated_at",
+            postgresql_where=is_active == false(),
+            sqlite_where=is_active == false(),
+        ),
+        Index(
+            "ix_products_search_vector", text("search_document"), postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_products_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        # Sin AUTOINCREMENT, SQLite reutiliza los ids de las filas borradas o
+        # archivadas y chocarían con los de products_archive
+        {"sqlite_autoincrement": True},
+    )
+
 class Invitation(Base):
     __tablename__ = "invitations"
 
@@ -53,7 +94,184 @@ class Invitation(Base):
     is_used = Column(Boolean, default=False)
     created_at = Column(Date)
     used_at = Column(Date, nullable=True)
+    # Último día en que se puede canjear (NULL = no caduca)
+    expires_at = Column(Date, nullable=True)
     sender_id = Column(Integer, ForeignKey("representatives.id"))
+    # Representante que canjeó la invitación (ver app/referrals.py)
+    redeemed_by_id = Column(Integer, ForeignKey("representatives.id"), nullable=True)
     
     # Relación con el representante que envió la invitación
-    sender = relationship("Representative", back_populates="invitations")
+    sender = relationship("Representative", back_populates="invitations", foreign_keys=[sender_id])
+
+    # Índice para la paginación por cursor de las invitaciones enviadas, un
+    # índice parcial con solo los códigos sin usar (validación y canje) y los
+    # que recorre el archivado (usadas por fecha de uso, sin usar por caducidad)
+    __table_args__ = (
+        Index("ix_invitations_sender_id_id", "sender_id", "id"),
+        Index(
+            "ix_invitations_unused_code", "code",
+            postgresql_where=is_used == false(),
+            sqlite_where=is_used == false(),
+        ),
+        Index(
+            "ix_invitations_used_at", "used_at",
+            postgresql_where=is_used == true(),
+            sqlite_where=is_used == true(),
+        ),
+        Index(
+            "ix_invitations_unused_expires_at", "expires_at",
+            postgresql_where=is_used == false(),
+            sqlite_where=is_used == false(),
+        ),
+        # Ids no reutilizables en SQLite, como en products
+        {"sqlite_autoincrement": True},
+    )
+
+
+# Tablas de archivo (ver app/archive.py): mismas columnas que las originales
+# más la fecha de archivado, y solo el índice de los listados por representante.
+# Conservan el id de la fila original, que nunca se reutiliza
+
+class ArchivedProduct(Base):
+    __tablename__ = "products_archive"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    description = Column(String)
+    price = Column(Float)
+    stock = Column(Integer)
+    is_active = Column(Boolean)
+    representative_id = Column(Integer, ForeignKey("representatives.id"))
+    updated_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_products_archive_representative_id_id", "representative_id", "id"),
+    )
+
+
+class ArchivedInvitation(Base):
+    __tablename__ = "invitations_archive"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String)
+    is_used = Column(Boolean)
+    created_at = Column(Date)
+    used_at = Column(Date, nullable=True)
+    expires_at = Column(Date, nullable=True)
+    sender_id = Column(Integer, ForeignKey("representatives.id"))
+    redeemed_by_id = Column(Integer, ForeignKey("representatives.id"), nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_invitations_archive_sender_id_id", "sender_id", "id"),
+        # Los códigos nuevos no pueden repetir uno archivado (ver app/routes/invite.py)
+        Index("ix_invitations_archive_code", "code"),
+    )
+
+
+class RepresentativeVersion(Base):
+    __tablename__ = "representative_versions"
+
+    # Versión de los datos del representante; cambia con cada escritura y genera los ETag
+    representative_id = Column(Integer, ForeignKey("representatives.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class RepresentativeStats(Base):
+    __tablename__ = "representative_stats"
+
+    # Totales por representante mantenidos en cada escritura (ver app/stats.py)
+    representative_id = Column(Integer, ForeignKey("representatives.id"), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    active_product_count = Column(Integer, nullable=False, default=0)
+    total_spend = Column(Float, nullable=False, default=0.0)
+    children_count = Column(Integer, nullable=False, default=0)
+    invitations_used = Column(Integer, nullable=False, default=0)
+    # Sin usar y sin caducar; las caducadas pasan a invitations_expired al archivarse
+    invitations_unused = Column(Integer, nullable=False, default=0)
+    invitations_expired = Column(Integer, nullable=False, default=0)
+    # Referidos directos y toda la red por debajo (ver app/referrals.py)
+    referrals_direct = Column(Integer, nullable=False, default=0)
+    referrals_total = Column(Integer, nullable=False, default=0)
+
+    # Índices del ranking de referidores (recorridos en orden descendente)
+    __table_args__ = (
+        Index("ix_representative_stats_referrals_total", "referrals_total", "representative_id"),
+        Index("ix_representative_stats_referrals_direct", "referrals_direct", "representative_id"),
+    )
+
+
+class ReferralPath(Base):
+    __tablename__ = "referral_paths"
+
+    # Tabla de clausura de la red de referidos (ver app/referrals.py): una fila
+    # por cada par (ancestro, descendiente) con la distancia entre ambos
+    ancestor_id = Column(Integer, ForeignKey("representatives.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("representatives.id"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    # Descendientes por nivel (árbol y conteos), ancestros de un representante
+    # y, como índice único parcial, un solo referidor directo por representante
+    __table_args__ = (
+        Index("ix_referral_paths_ancestor_id_depth_descendant_id", "ancestor_id", "depth", "descendant_id"),
+        Index("ix_referral_paths_descendant_id_depth", "descendant_id", "depth"),
+        Index(
+            "uq_referral_paths_referrer", "descendant_id", unique=True,
+            postgresql_where=depth == 1,
+            sqlite_where=depth == 1,
+        ),
+    )
+
+
+class TaskJob(Base):
+    __tablename__ = "task_jobs"
+
+    # Tareas diferidas del backend persistente de app/tasks.py
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+
+    # Índice para reclamar la siguiente tarea pendiente
+    __table_args__ = (
+        Index("ix_task_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # Respuestas guardadas por Idempotency-Key (backend sql de app/idempotency.py).
+    # status_code es NULL mientras la primera petición se está ejecutando
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    headers = Column(Text, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    # Índice para purgar las claves caducadas
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+
+class TokenRevocation(Base):
+    __tablename__ = "token_revocations"
+
+    # Último cambio del representante que invalida los datos de sus tokens de
+    # acceso (ver app/revocations.py), en segundos desde epoch como `iat`
+    representative_id = Column(Integer, ForeignKey("representatives.id"), primary_key=True)
+    revoked_at = Column(Integer, nullable=False)
+
+    # Índice para leer las revocaciones recientes y purgar las antiguas
+    __table_args__ = (
+        Index("ix_token_revocations_revoked_at", "revoked_at"),
+    )
@@ -0,0 +1,178 @@
+import base64
+import binascii
+import json
+import os
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import select, tuple_, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import URL
+
+from .responses import json_response
+
+# Configuración de paginación
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class PageParams:
+    cursor: Optional[str]
+    limit: int
+    fields: Optional[List[str]]
+    sort: str
+    url: str
+
+
+def page_params(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por comas"),
+    sort: str = Query("id", description="Campo de orden; prefijo '-' para orden descendente"),
+) -> PageParams:
+    """Dependency con los parámetros comunes de los listados"""
+    requested = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    return PageParams(cursor=cursor, limit=limit, fields=requested, sort=sort, url=str(request.url))
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        values = None
+    if not isinstance(values, list) or not values:
+        raise _bad_request("Cursor inválido")
+    return values
+
+
+def _nullable(column) -> bool:
+    """Si la columna (de un modelo o de una subconsulta) admite NULL; en la duda, sí"""
+    return getattr(getattr(column, "expression", column), "nullable", True)
+
+
+def _cursor_value_ok(column, value, nullable: bool) -> bool:
+    """Si `value` (del JSON del cursor) es del tipo de la columna"""
+    if value is None:
+        return nullable
+    expected = column.type.python_type
+    # En JSON los booleanos también son int para isinstance
+    return isinstance(value, expected) and (expected is bool or not isinstance(value, bool))
+
+
+def _after(keys: Sequence, values: Sequence, descending: bool):
+    """Condición de las filas que van después de `values` en el orden de `keys`"""
+    position = tuple_(*keys) if len(keys) > 1 else keys[0]
+    boundary = tuple_(*values) if len(keys) > 1 else values[0]
+    return position < boundary if descending else position > boundary
+
+
+async def paginate(
+    db: AsyncSession,
+    model,
+    fields: Sequence[str],
+    params: PageParams,
+    where: Iterable = (),
+    sortable: Sequence[str] = ("id",),
+) -> JSONResponse:
+    """
+    Devuelve una página de `model` (un modelo o las columnas `.c` de una
+    subconsulta) usando paginación por cursor (keyset). Solo se seleccionan
+    las columnas pedidas en `fields`; el cursor de la siguiente página se
+    envía en la cabecera X-Next-Cursor y en Link.
+
+    Si la columna de orden admite NULL, esas filas van al final (al principio
+    en orden descendente) ordenadas por id. Las filas con valor y las NULL se
+    leen por separado, cada parte en el orden de su índice, y se unen en la
+    misma consulta.
+    """
+    selected = params.fields or list(fields)
+    unknown = [field for field in selected if field not in fields]
+    if unknown:
+        raise _bad_request(f"Campos no válidos: {', '.join(unknown)}")
+    if "id" not in selected:
+        selected = ["id"] + selected
+
+    descending = params.sort.startswith("-")
+    sort_field = params.sort.lstrip("-")
+    if sort_field not in sortable:
+        raise _bad_request(f"No se puede ordenar por '{sort_field}'")
+
+    id_column = model.id
+    sort_column = getattr(model, sort_field)
+    columns = list(selected)
+    if sort_field not in columns:
+        columns.append(sort_field)
+
+    query = select(*[getattr(model, field) for field in columns]).where(*where)
+
+    def ordered(part, keys):
+        return part.order_by(*[key.desc() if descending else key.asc() for key in keys]).limit(params.limit + 1)
+
+    if sort_field == "id":
+        keys = [id_column]
+    else:
+        keys = [sort_column, id_column]
+
+    values = None
+    if params.cursor:
+        values = decode_cursor(params.cursor)
+        if len(values) != len(keys) or not all(
+            _cursor_value_ok(key, value, key is not id_column and _nullable(key)) for key, value in zip(keys, values)
+        ):
+            raise _bad_request("Cursor inválido")
+
+    if len(keys) == 1 or not _nullable(sort_column):
+        if values is not None:
+            query = query.where(_after(keys, values, descending))
+        query = ordered(query, keys)
+    else:
+        present = query.where(sort_column.isnot(None))
+        missing = query.where(sort_column.is_(None))
+        if values is not None and values[0] is None:
+            # El cursor está entre las NULL: avanza por id y las filas con
+            # valor ya pasaron (o, en orden descendente, faltan todas)
+            missing = missing.where(_after([id_column], values[1:], descending))
+            present = present if descending else None
+        elif values is not None:
+            # El cursor está entre las filas con valor: las NULL faltan todas
+            # (o, en orden descendente, ya pasaron)
+            present = present.where(_after(keys, values, descending))
+            missing = None if descending else missing
+        parts = [ordered(part, part_keys) for part, part_keys in ((present, keys), (missing, [id_column])) if part is not None]
+        merged = union_all(*[select(part.subquery()) for part in parts]).subquery()
+        sort_key = merged.c[sort_field]
+        keys_order = [sort_key.is_(None), sort_key, merged.c[id_column.key]]
+        query = select(*[merged.c[field] for field in columns]).order_by(
+            *[key.desc() if descending else key.asc() for key in keys_order]
+        ).limit(params.limit + 1)
+
+    # Tuplas en lugar de mappings: `selected` es un prefijo de `columns`
+    rows = (await db.execute(query)).all()
+    headers = {}
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        last = rows[-1]
+        cursor = encode_cursor([last[columns.index(key.key)] for key in keys])
+        headers[NEXT_CURSOR_HEADER] = cursor
+        next_url = URL(params.url).include_query_params(cursor=cursor)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    items = [dict(zip(selected, row)) for row in rows]
+    return json_response(items, headers=headers)
+
@@ -0,0 +1,96 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from .metrics import Gauge
+
+# Configuración del hash de contraseñas
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")
+# Por defecto, los núcleos se reparten entre los procesos del servidor
+PASSWORD_HASH_WORKERS = int(os.getenv(
+    "PASSWORD_HASH_WORKERS",
+    str(max(1, min(4, (os.cpu_count() or 1) // max(1, int(os.getenv("WEB_CONCURRENCY", "1")))))),
+))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Si cambia BCRYPT_ROUNDS, needs_update() marca los hashes antiguos para rehacerlos
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+_executor: Optional[Executor] = None
+_pending = 0
+
+
+def _create_executor() -> Executor:
+    if PASSWORD_HASH_EXECUTOR == "process":
+        return ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+    # bcrypt libera el GIL, así que los hilos bastan para usar varios núcleos
+    return ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        _executor = _create_executor()
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def queue_depth() -> int:
+    """Operaciones de hash en curso o esperando un worker"""
+    return _pending
+
+
+QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth", "Operaciones de hash de contraseñas pendientes", function=queue_depth
+)
+
+
+def hash_password_sync(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio ocupado, intente de nuevo",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """Calcula el hash bcrypt fuera del event loop"""
+    return await _run(hash_password_sync, password)
+
+
+async def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña fuera del event loop. Si el hash usa un coste
+    distinto al configurado devuelve también el hash nuevo para guardarlo.
+    """
+    return await _run(_verify_and_update, plain_password, hashed_password)
@@ -0,0 +1,137 @@
+import contextvars
+import logging
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Modo de depuración de consultas (desarrollo y CI)
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "false").lower() in ("1", "true", "yes")
+QUERY_DEBUG_STRICT = os.getenv("QUERY_DEBUG_STRICT", "false").lower() in ("1", "true", "yes")
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "10"))
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))
+
+# Registro de consultas lentas (0 lo desactiva); EXPLAIN solo si se pide o en modo depuración
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", str(QUERY_DEBUG)).lower() in ("1", "true", "yes")
+
+_PLACEHOLDER_LIST = re.compile(r"(\?|%\(\w+\)s|%s|\$\d+|:\w+)(\s*,\s*(\?|%\(\w+\)s|%s|\$\d+|:\w+))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Se lanza en modo estricto cuando una ruta supera su presupuesto de consultas"""
+
+
+@dataclass
+class QueryTracker:
+    budget: int = QUERY_BUDGET
+    queries: int = 0
+    shapes: Counter = field(default_factory=Counter)
+
+
+_tracker: contextvars.ContextVar[Optional[QueryTracker]] = contextvars.ContextVar("query_tracker", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Normaliza la sentencia para agrupar las que solo difieren en parámetros o en el tamaño de un IN"""
+    shape = _PLACEHOLDER_LIST.sub("?", statement)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def query_budget(max_queries: int):
+    """
+    Dependency que fija el presupuesto de consultas de una ruta:
+    `dependencies=[Depends(query_budget(2))]`. Solo tiene efecto con QUERY_DEBUG.
+    """
+    async def set_budget():
+        tracker = _tracker.get()
+        if tracker is not None:
+            tracker.budget = max_queries
+    return set_budget
+
+
+def _explain(conn, statement: str, parameters) -> list:
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    conn.info["explaining"] = True
+    try:
+        return [" ".join(str(value) for value in row) for row in conn.exec_driver_sql(prefix + statement, parameters)]
+    except Exception as exc:  # el plan es informativo: nunca debe romper la consulta original
+        return [f"EXPLAIN falló: {exc}"]
+    finally:
+        conn.info["explaining"] = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get("explaining"):
+        return
+    conn.info.setdefault("debug_start_time", []).append(time.perf_counter())
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.queries += 1
+        tracker.shapes[statement_shape(statement)] += 1
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get("explaining"):
+        return
+    elapsed_ms = (time.perf_counter() - conn.info["debug_start_time"].pop()) * 1000
+    if not SLOW_QUERY_MS or elapsed_ms < SLOW_QUERY_MS:
+        return
+
+    extra = {"statement": statement, "duration_ms": round(elapsed_ms, 2)}
+    streaming = context is not None and context.execution_options.get("stream_results")
+    is_select = statement.lstrip().upper().startswith(("SELECT", "WITH"))
+    if SLOW_QUERY_EXPLAIN and is_select and not executemany and not streaming:
+        extra["plan"] = _explain(conn, statement, parameters)
+    logger.warning("slow_query", extra=extra)
+
+
+def install(engine):
+    """Registra los eventos de depuración en el engine (síncrono o asíncrono)"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def check_tracker(tracker: QueryTracker, route: str):
+    """Registra (o, en modo estricto, lanza) los excesos de presupuesto y las consultas repetidas"""
+    problems = []
+    if tracker.queries > tracker.budget:
+        problems.append(f"{tracker.queries} consultas con un presupuesto de {tracker.budget}")
+        logger.warning("query_budget_exceeded", extra={
+            "route": route, "queries": tracker.queries, "budget": tracker.budget
+        })
+    for shape, count in tracker.shapes.items():
+        if count >= QUERY_REPEAT_THRESHOLD:
+            problems.append(f"posible N+1: {count} x {shape}")
+            logger.warning("possible_n_plus_one", extra={"route": route, "statement": shape, "count": count})
+    if problems and QUERY_DEBUG_STRICT:
+        raise QueryBudgetExceeded(f"{route}: " + "; ".join(problems))
+
+
+class QueryBudgetMiddleware:
+    """Cuenta las consultas de cada petición y comprueba el presupuesto al terminar"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = QueryTracker()
+        token = _tracker.set(tracker)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _tracker.reset(token)
+        route = getattr(scope.get("route"), "path", scope["path"])
+        check_tracker(tracker, f"{scope['method']} {route}")
@@ -0,0 +1,263 @@
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Saltos de proxy de confianza delante de la API (Render usa uno); 0 ignora X-Forwarded-For
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
+# Límites de concurrencia (0 = sin límite): total por worker y para las rutas protegidas
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "0"))
+MAX_CONCURRENT_PROTECTED = int(os.getenv("MAX_CONCURRENT_PROTECTED", "20"))
+# Conexiones largas que no cuentan como peticiones en curso (tienen su propio límite en app/events.py)
+STREAMING_PATHS = {"/api/events", "/api/events/"}
+
+# Tamaño máximo del cuerpo que se lee para extraer la cuenta del login
+MAX_ACCOUNT_BODY = 16 * 1024
+
+REJECTED = Counter(
+    "http_requests_rejected_total",
+    "Peticiones rechazadas antes de llegar a la ruta por límite de tasa o de concurrencia",
+    ("rule", "reason"),
+)
+
+
+@dataclass(frozen=True)
+class Rate:
+    """Cubeta de `capacity` fichas que se rellena a razón de `capacity / period` por segundo"""
+    capacity: float
+    period: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Rate"]:
+        """'10/60' son 10 peticiones por minuto; vacío o '0' desactiva el límite"""
+        if not value or value.strip() == "0":
+            return None
+        capacity, _, period = value.partition("/")
+        return cls(float(capacity), float(period or 1))
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    name: str
+    method: str
+    path: "re.Pattern"
+    per_ip: Optional[Rate] = None
+    # Campo del formulario que identifica la cuenta (solo cuerpos x-www-form-urlencoded).
+    # La cubeta es por IP y cuenta: frena los intentos contra una cuenta desde
+    # una IP sin que otra IP pueda bloquear el acceso a la cuenta
+    account_field: Optional[str] = None
+    per_account: Optional[Rate] = None
+
+
+RULES: List[RateLimitRule] = [
+    RateLimitRule(
+        "login", "POST", re.compile(r"^/api/representatives/token/?$"),
+        per_ip=Rate.parse(os.getenv("RATE_LIMIT_LOGIN_IP", "20/60")),
+        account_field="username",
+        per_account=Rate.parse(os.getenv("RATE_LIMIT_LOGIN_ACCOUNT", "5/60")),
+    ),
+    RateLimitRule(
+        "register", "POST", re.compile(r"^/api/representatives/?$"),
+        per_ip=Rate.parse(os.getenv("RATE_LIMIT_REGISTER_IP", "5/60")),
+    ),
+    RateLimitRule(
+        "validate_invitation", "POST", re.compile(r"^/api/invites/validate/[^/]+$"),
+        per_ip=Rate.parse(os.getenv("RATE_LIMIT_VALIDATE_IP", "30/60")),
+    ),
+]
+
+
+class RateLimitBackend:
+    """
+    Interfaz del almacén de cubetas. La implementación por defecto vive en el
+    proceso (un límite por worker); para un límite global entre workers se
+    puede implementar sobre un servicio compartido (p. ej. un script de Redis
+    que haga el mismo cálculo de forma atómica).
+    """
+
+    async def acquire(self, key: str, rate: Rate, cost: float = 1.0) -> float:
+        """Consume `cost` fichas; devuelve 0 si se permite o los segundos que faltan para poder hacerlo"""
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_KEYS):
+        self.maxsize = maxsize
+        # clave -> (fichas, instante de la última actualización); LRU para acotar memoria
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, key: str, rate: Rate, cost: float = 1.0) -> float:
+        # Sin await en medio: la operación es atómica dentro del event loop
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (rate.capacity, now))
+        tokens = min(rate.capacity, tokens + (now - updated) * rate.refill_per_second)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / rate.refill_per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+backend: RateLimitBackend = MemoryRateLimitBackend()
+
+
+def set_rate_limit_backend(new_backend: RateLimitBackend):
+    """Permite usar un almacén compartido entre workers"""
+    global backend
+    backend = new_backend
+
+
+def client_ip(scope) -> str:
+    if TRUSTED_PROXY_HOPS:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                addresses = [address.strip() for address in value.decode("latin-1").split(",")]
+                if len(addresses) >= TRUSTED_PROXY_HOPS:
+                    return addresses[-TRUSTED_PROXY_HOPS]
+                break
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def match_rule(scope) -> Optional[RateLimitRule]:
+    for rule in RULES:
+        if scope["method"] == rule.method and rule.path.match(scope["path"]):
+            return rule
+    return None
+
+
+async def _buffer_body(receive) -> Tuple[bytes, list]:
+    """Lee el cuerpo (hasta MAX_ACCOUNT_BODY) y devuelve también los mensajes para reenviarlos"""
+    messages, size = [], 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        if not message.get("more_body") or size > MAX_ACCOUNT_BODY:
+            break
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.request")
+    return body, messages
+
+
+def _replay(messages: list, receive):
+    pending = list(messages)
+
+    async def replay_receive():
+        if pending:
+            return pending.pop(0)
+        return await receive()
+    return replay_receive
+
+
+def _account(headers, body: bytes, field: str) -> Optional[str]:
+    content_type = dict(headers).get(b"content-type", b"").decode("latin-1")
+    if not content_type.startswith("application/x-www-form-urlencoded"):
+        return None
+    values = parse_qs(body.decode("utf-8", "replace")).get(field)
+    return values[0].strip().lower() if values else None
+
+
+async def _reject(send, status_code: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI que protege las rutas sin autenticación y costosas (login,
+    registro, validación de invitaciones) con cubetas de fichas por IP y por
+    IP y cuenta, y limita la concurrencia. Rechaza con 429 (tasa) o 503
+    (concurrencia) y Retry-After antes de que la petición toque la base de datos.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+        self.protected_in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in STREAMING_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if MAX_CONCURRENT_REQUESTS and self.in_flight >= MAX_CONCURRENT_REQUESTS:
+            REJECTED.inc("global", "concurrency")
+            await _reject(send, 503, "Servidor ocupado, inténtelo de nuevo", 1)
+            return
+
+        rule = match_rule(scope) if RATE_LIMIT_ENABLED else None
+        if rule is None:
+            self.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+            return
+
+        if MAX_CONCURRENT_PROTECTED and self.protected_in_flight >= MAX_CONCURRENT_PROTECTED:
+            REJECTED.inc(rule.name, "concurrency")
+            await _reject(send, 503, "Servidor ocupado, inténtelo de nuevo", 1)
+            return
+
+        ip = client_ip(scope)
+        if rule.per_ip:
+            wait = await backend.acquire(f"{rule.name}:ip:{ip}", rule.per_ip)
+            if wait:
+                REJECTED.inc(rule.name, "ip")
+                logger.warning("rate_limited", extra={"rule": rule.name, "client_ip": ip, "scope": "ip"})
+                await _reject(send, 429, "Demasiadas solicitudes", wait)
+                return
+
+        if rule.account_field and rule.per_account:
+            body, messages = await _buffer_body(receive)
+            receive = _replay(messages, receive)
+            account = _account(scope["headers"], body, rule.account_field)
+            if account:
+                wait = await backend.acquire(f"{rule.name}:account:{ip}:{account}", rule.per_account)
+                if wait:
+                    REJECTED.inc(rule.name, "account")
+                    logger.warning("rate_limited", extra={"rule": rule.name, "client_ip": ip, "scope": "account"})
+                    await _reject(send, 429, "Demasiadas solicitudes", wait)
+                    return
+
+        self.in_flight += 1
+        self.protected_in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            self.protected_in_flight -= 1
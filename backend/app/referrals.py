@@ -0,0 +1,146 @@
+"""
+Red de referidos.
+
+Al canjear una invitación se guarda quién la canjeó (invitations.redeemed_by_id)
+y se amplía la tabla de clausura referral_paths: una fila (ancestro,
+descendiente, distancia) por cada par de la red, de modo que "a quién trajo
+este representante, directa o indirectamente" es un rango del índice
+(ancestor_id, depth, descendant_id) y no un recorrido recursivo. Los totales
+(referidos directos y red completa) se mantienen en representative_stats, así
+que el tamaño de la red y el ranking son lecturas por índice.
+
+Cada representante tiene como mucho un referidor (índice único parcial sobre
+las filas de distancia 1) y la red no admite ciclos. El canje de una
+invitación siempre es válido, pero solo amplía la red si respeta esas
+reglas: canjear la propia invitación, canjear otra cuando ya se tiene
+referidor o la de alguien de la propia red se registra en la invitación sin
+tocar referral_paths. En PostgreSQL los canjes que amplían la red se
+serializan con un advisory lock de transacción para que dos canjes
+simultáneos no puedan formar un ciclo (los de quien ya tiene referidor se
+descartan antes, sin esperarlo); en SQLite ya los serializa el bloqueo de
+escritura.
+
+Para reconstruir la tabla desde las invitaciones (incluidas las archivadas):
+
+    python -m app.referrals
+"""
+from typing import Dict
+
+from sqlalchemy import Integer, delete, exists, insert, literal, select, text, true, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import stats
+from .models import ArchivedInvitation, Invitation, ReferralPath, RepresentativeStats
+
+ADVISORY_LOCK_KEY = 727_002
+# Filas por INSERT al reconstruir la tabla
+REBUILD_CHUNK_SIZE = 5000
+
+
+async def add_referral(db: AsyncSession, referrer_id: int, referred_id: int) -> bool:
+    """
+    Registra que `referred_id` entró por una invitación de `referrer_id`:
+    une su red (él y sus descendientes) bajo el referidor y todos sus
+    ancestros y actualiza los totales de estos. Devuelve False, sin tocar la
+    red, si el canje no puede formar parte de ella (su propia invitación, ya
+    tiene referidor o el referidor está en su red). No hace commit.
+    """
+    if referrer_id == referred_id:
+        return False
+    path = ReferralPath
+    has_referrer = select(exists().where(path.descendant_id == referred_id, path.depth == 1))
+    # La mayoría de los canjes rechazados son de quien ya tiene referidor: se
+    # descartan por el índice único antes de esperar el bloqueo, que solo
+    # toman los canjes que pueden ampliar la red
+    if await db.scalar(has_referrer):
+        return False
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        # Un canje simultáneo pudo asignarle referidor mientras se esperaba
+        if await db.scalar(has_referrer):
+            return False
+    if await db.scalar(select(exists().where(path.ancestor_id == referred_id, path.descendant_id == referrer_id))):
+        return False
+
+    # Ancestros del referidor (incluido él) x red del referido (incluido él)
+    ancestors = union_all(
+        select(path.ancestor_id.label("id"), path.depth.label("depth")).where(path.descendant_id == referrer_id),
+        select(literal(referrer_id, Integer).label("id"), literal(0, Integer).label("depth")),
+    ).subquery()
+    descendants = union_all(
+        select(path.descendant_id.label("id"), path.depth.label("depth")).where(path.ancestor_id == referred_id),
+        select(literal(referred_id, Integer).label("id"), literal(0, Integer).label("depth")),
+    ).subquery()
+    await db.execute(insert(path).from_select(
+        ["ancestor_id", "descendant_id", "depth"],
+        select(ancestors.c.id, descendants.c.id, ancestors.c.depth + descendants.c.depth + 1)
+        .select_from(ancestors.join(descendants, true())),
+    ))
+
+    # La red del referido se suma a la de cada ancestro; los ancestros ya tienen
+    # fila de totales porque tienen al menos un referido
+    added = 1 + (await db.scalar(
+        select(RepresentativeStats.referrals_total).where(RepresentativeStats.representative_id == referred_id)
+    ) or 0)
+    await stats.apply_delta(db, referrer_id, referrals_direct=1, referrals_total=added)
+    await db.execute(
+        update(RepresentativeStats)
+        .where(RepresentativeStats.representative_id.in_(
+            select(path.ancestor_id).where(path.descendant_id == referrer_id, path.depth > 0)
+        ))
+        .values(referrals_total=RepresentativeStats.referrals_total + added)
+        .execution_options(synchronize_session=False)
+    )
+    return True
+
+
+def _in_network(parents: Dict[int, int], ancestor_id: int, representative_id: int) -> bool:
+    """Si `representative_id` es `ancestor_id` o está en su red"""
+    node = representative_id
+    while node is not None:
+        if node == ancestor_id:
+            return True
+        node = parents.get(node)
+    return False
+
+
+def rebuild_paths(connection):
+    """
+    Recalcula referral_paths desde las invitaciones canjeadas (incluidas las
+    archivadas) con las reglas de `add_referral`, aplicadas en orden de canje.
+    Las invitaciones solo guardan el día del canje: dentro del mismo día se
+    toma el orden de id. Conexión síncrona.
+    """
+    redemptions = union_all(*[
+        select(table.sender_id, table.redeemed_by_id, table.used_at, table.id)
+        .where(table.redeemed_by_id.isnot(None))
+        for table in (Invitation, ArchivedInvitation)
+    ]).subquery()
+    ordered = select(redemptions.c.sender_id, redemptions.c.redeemed_by_id).order_by(
+        redemptions.c.used_at, redemptions.c.id
+    )
+    parents: Dict[int, int] = {}
+    for referrer_id, referred_id in connection.execute(ordered):
+        if referred_id in parents or _in_network(parents, referred_id, referrer_id):
+            continue
+        parents[referred_id] = referrer_id
+
+    rows = []
+    for descendant_id in parents:
+        ancestor_id, depth = parents[descendant_id], 1
+        while ancestor_id is not None:
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": descendant_id, "depth": depth})
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    connection.execute(delete(ReferralPath))
+    for start in range(0, len(rows), REBUILD_CHUNK_SIZE):
+        connection.execute(insert(ReferralPath), rows[start:start + REBUILD_CHUNK_SIZE])
+
+
+if __name__ == "__main__":
+    from .database import create_tables, engine
+
+    create_tables()
+    with engine.begin() as connection:
+        rebuild_paths(connection)
+        stats.rebuild_stats(connection)
+    print("Red de referidos y totales recalculados")
@@ -0,0 +1,177 @@
+"""
+Réplicas de lectura.
+
+Con DATABASE_REPLICA_URLS (URLs separadas por comas, mismo formato que
+DATABASE_URL) las rutas de solo lectura usan `get_read_db`, que reparte las
+sesiones entre las réplicas sanas por turnos; las escrituras siguen usando
+`get_db` (el primario). Sin réplicas, `get_read_db` también usa el primario.
+
+Tras una escritura de un representante (`changes.mark_changed`) sus lecturas
+van al primario durante REPLICA_STICKY_SECONDS, para que vea sus propios
+cambios aunque las réplicas vayan con retraso. La marca se guarda en una
+cache en memoria del worker; con varios workers se puede compartir con
+`set_sticky_cache` (misma interfaz que la cache de app/cache.py).
+
+Un bucle comprueba cada REPLICA_HEALTH_INTERVAL segundos que cada réplica
+responde y, en PostgreSQL, que su retraso no supera REPLICA_MAX_LAG; las
+que fallan dejan de recibir lecturas hasta que se recuperan.
+
+Para probarlo en local con SQLite basta una copia del fichero (sin
+replicación, así que la copia se queda con los datos del momento):
+
+    cp cf-incubator.db replica.db
+    DATABASE_REPLICA_URLS=sqlite:///./replica.db uvicorn app.main:app
+"""
+import asyncio
+import itertools
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from fastapi import Depends
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from .auth import Principal, get_current_active_representative
+from .cache import CacheBackend, MemoryCacheBackend
+from .database import AsyncSessionLocal, engine_options, get_async_url
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_STICKY_MAX_KEYS = int(os.getenv("REPLICA_STICKY_MAX_KEYS", "100000"))
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", "2"))
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "10"))
+
+# Retraso de una réplica de PostgreSQL; 0 si ya ha aplicado todo lo recibido
+# (si no, un primario sin escrituras parecería acumular retraso)
+_POSTGRES_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+READ_SESSIONS = Counter("db_read_sessions_total", "Sesiones de lectura por destino", ("target",))
+REPLICA_HEALTHY = Gauge("db_replica_healthy", "1 si la réplica recibe lecturas", ("replica",))
+
+
+def _postgres_url(url: str) -> str:
+    return url.replace("postgres://", "postgresql://", 1) if url.startswith("postgres://") else url
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: AsyncEngine
+    session_factory: async_sessionmaker = field(repr=False)
+    healthy: bool = True
+
+
+def _create_replica(index: int, url: str) -> Replica:
+    async_url = get_async_url(_postgres_url(url))
+    engine = create_async_engine(async_url, **engine_options(async_url))
+    session_factory = async_sessionmaker(
+        bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    return Replica(name=f"replica{index}", engine=engine, session_factory=session_factory)
+
+
+replicas: List[Replica] = [_create_replica(index, url) for index, url in enumerate(DATABASE_REPLICA_URLS)]
+
+_turn = itertools.count()
+_health_task: Optional[asyncio.Task] = None
+
+sticky_cache: CacheBackend = MemoryCacheBackend(maxsize=REPLICA_STICKY_MAX_KEYS, ttl=REPLICA_STICKY_SECONDS)
+
+
+def set_sticky_cache(backend: CacheBackend):
+    """Permite compartir las marcas de lectura en el primario entre workers"""
+    global sticky_cache
+    sticky_cache = backend
+
+
+def _sticky_key(representative_id: int) -> str:
+    return f"read-primary:{representative_id}"
+
+
+async def stick(representative_id: int):
+    """Envía las lecturas del representante al primario durante REPLICA_STICKY_SECONDS"""
+    if replicas:
+        await sticky_cache.set(_sticky_key(representative_id), True, ttl=REPLICA_STICKY_SECONDS)
+
+
+def choose_replica() -> Optional[Replica]:
+    healthy = [replica for replica in replicas if replica.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_turn) % len(healthy)]
+
+
+async def read_session_factory(representative_id: int) -> async_sessionmaker:
+    """Fábrica de sesiones para las lecturas del representante: una réplica sana o el primario"""
+    replica = None
+    if replicas and not await sticky_cache.get(_sticky_key(representative_id)):
+        replica = choose_replica()
+    READ_SESSIONS.inc(replica.name if replica else "primary")
+    return replica.session_factory if replica else AsyncSessionLocal
+
+
+async def get_read_db(current_representative: Principal = Depends(get_current_active_representative)):
+    """Dependencia de las rutas de solo lectura del representante autenticado"""
+    session_factory = await read_session_factory(current_representative.id)
+    async with session_factory() as db:
+        yield db
+
+
+async def _lag(replica: Replica) -> float:
+    async with replica.engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            return float(await connection.scalar(_POSTGRES_LAG) or 0)
+        await connection.execute(text("SELECT 1"))
+        return 0.0
+
+
+async def check_replica(replica: Replica):
+    try:
+        lag = await asyncio.wait_for(_lag(replica), REPLICA_HEALTH_TIMEOUT)
+        healthy, reason = lag <= REPLICA_MAX_LAG, f"lag {lag:.1f}s"
+    except Exception as exc:
+        healthy, reason = False, f"{type(exc).__name__}: {exc}"
+    if healthy != replica.healthy:
+        logger.warning(
+            "replica_healthy" if healthy else "replica_unhealthy",
+            extra={"replica": replica.name, "reason": reason},
+        )
+    replica.healthy = healthy
+    REPLICA_HEALTHY.set(1 if healthy else 0, replica.name)
+
+
+async def check_replicas():
+    await asyncio.gather(*(check_replica(replica) for replica in replicas))
+
+
+async def _health_loop():
+    while True:
+        await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+        await check_replicas()
+
+
+async def start():
+    """Comprueba las réplicas antes de recibir tráfico y lanza el bucle de comprobación"""
+    global _health_task
+    if replicas and _health_task is None:
+        await check_replicas()
+        _health_task = asyncio.create_task(_health_loop())
+
+
+async def stop():
+    global _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        await asyncio.gather(_health_task, return_exceptions=True)
+        _health_task = None
+    for replica in replicas:
+        await replica.engine.dispose()
@@ -0,0 +1,44 @@
+import logging
+import os
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el JSON de la librería estándar
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Modo rápido: las rutas de listas devuelven dicts planos codificados con orjson
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+if FAST_RESPONSES and orjson is None:
+    logger.warning("FAST_RESPONSES activado pero orjson no está instalado; se usa json estándar")
+
+FAST_JSON = FAST_RESPONSES and orjson is not None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse codificada con orjson; serializa date, datetime y UUID sin jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def app_options() -> dict:
+    """
+    Opciones para FastAPI(): solo se cambia la clase de respuesta por defecto
+    en modo rápido, porque fijarla desactiva la serialización directa con
+    Pydantic que FastAPI usa para las rutas con response_model.
+    """
+    return {"default_response_class": FastJSONResponse} if FAST_JSON else {}
+
+
+def json_response(content: Any, **kwargs) -> JSONResponse:
+    """Respuesta JSON para contenido formado por dicts, listas y tipos básicos (incluidas fechas)"""
+    if FAST_JSON:
+        return FastJSONResponse(content, **kwargs)
+    return JSONResponse(jsonable_encoder(content), **kwargs)
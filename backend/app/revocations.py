@@ -0,0 +1,141 @@
+"""
+Revocación de los datos que llevan los tokens de acceso.
+
+Los tokens de acceso llevan el id y el estado del representante
+(app/tokens.py) para autenticar sin consultar la base de datos, y la cache
+de app/auth.py guarda esos mismos datos un tiempo. Cuando cambian (correo,
+desactivación), `revoke` guarda el momento en token_revocations, en la
+misma transacción que el cambio: los tokens
+emitidos hasta ese segundo y las entradas de la cache guardadas hasta
+entonces dejan de usarse y se vuelve a consultar la base de datos.
+
+La tabla es la fuente compartida entre workers y no pierde entradas por
+tamaño, a diferencia de una cache. Cada worker guarda en memoria todas las
+revocaciones vigentes: las carga al arrancar y las vuelve a leer cada
+REVOCATION_POLL_INTERVAL segundos, que es el retraso máximo con el que los
+demás workers ven una revocación (el worker que la hace la aplica al
+momento). Una revocación deja de importar cuando expiran los tokens de
+acceso emitidos antes de ella.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import tokens
+from .database import AsyncSessionLocal, dialect_insert
+from .models import TokenRevocation
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_POLL_INTERVAL = float(os.getenv("REVOCATION_POLL_INTERVAL", "1"))
+# Segundos que se suman al momento de una revocación: cubren el tiempo hasta
+# el commit del cambio que la acompaña
+REVOCATION_COMMIT_MARGIN = int(os.getenv("REVOCATION_COMMIT_MARGIN", "1"))
+
+_PENDING = "pending_revocations"
+
+# representative_id -> segundo de la última revocación
+_revoked: Dict[int, int] = {}
+
+
+def now() -> int:
+    """Segundo actual, en la misma unidad que `iat`"""
+    return int(time.time())
+
+
+def _window_start() -> int:
+    # Los tokens de acceso emitidos antes ya expiraron
+    return now() - tokens.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+def is_current(representative_id: int, issued_at: int) -> bool:
+    """
+    Si los datos del representante obtenidos en el segundo `issued_at` (el
+    `iat` de un token o el momento en que se cachearon) siguen vigentes. Se
+    compara en segundos enteros: lo obtenido en el mismo segundo que la
+    revocación se trata como anterior a ella.
+    """
+    revoked_at = _revoked.get(representative_id)
+    return revoked_at is None or issued_at > revoked_at
+
+
+def _remember(representative_id: int, revoked_at: int):
+    _revoked[representative_id] = max(_revoked.get(representative_id, revoked_at), revoked_at)
+
+
+async def revoke(db: AsyncSession, representative_id: int):
+    """
+    Revoca los datos emitidos hasta ahora dentro de la transacción de `db`,
+    sin hacer commit: se llama antes del commit del cambio, así que ambos se
+    guardan o se pierden juntos. El momento lleva REVOCATION_COMMIT_MARGIN
+    segundos de margen para cubrir lo que se lea entre esta llamada y el
+    commit. Este worker la aplica en memoria al hacer commit.
+    """
+    revoked_at = now() + REVOCATION_COMMIT_MARGIN
+    statement = dialect_insert(db)(TokenRevocation).values(representative_id=representative_id, revoked_at=revoked_at)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[TokenRevocation.representative_id],
+        set_={"revoked_at": revoked_at},
+    ))
+    # Las revocaciones son raras: se aprovecha para borrar las que ya no afectan a ningún token
+    await db.execute(delete(TokenRevocation).where(TokenRevocation.revoked_at < _window_start()))
+    db.sync_session.info.setdefault(_PENDING, []).append((representative_id, revoked_at))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    for representative_id, revoked_at in session.info.pop(_PENDING, ()):
+        _remember(representative_id, revoked_at)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
+
+
+async def refresh(session_factory=AsyncSessionLocal):
+    """Lee las revocaciones vigentes de la tabla y olvida las que ya no importan"""
+    window_start = _window_start()
+    async with session_factory() as db:
+        result = await db.execute(
+            select(TokenRevocation.representative_id, TokenRevocation.revoked_at)
+            .where(TokenRevocation.revoked_at >= window_start)
+        )
+        rows = result.all()
+    for representative_id, revoked_at in rows:
+        _remember(representative_id, revoked_at)
+    for representative_id in [key for key, revoked_at in _revoked.items() if revoked_at < window_start]:
+        del _revoked[representative_id]
+
+
+_task: Optional[asyncio.Task] = None
+
+
+async def _loop():
+    while True:
+        await asyncio.sleep(REVOCATION_POLL_INTERVAL)
+        try:
+            await refresh()
+        except Exception:
+            logger.exception("revocations_refresh_failed")
+
+
+async def start():
+    global _task
+    await refresh()
+    if _task is None:
+        _task = asyncio.create_task(_loop())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List
 from .. import models, schemas
 from ..database import get_db
+from ..replicas import get_read_db
+from ..query_debug import query_budget
+from ..pagination import PageParams, page_params, paginate
+from .. import bulk, changes, stats
+from ..http_cache import conditional_response
 from .. import auth
 
 router = APIRouter(
@@ -10,62 +16,146 @@ router = APIRouter(
     tags=["children"]
 )
 
-@router.get("/", response_model=List[schemas.ChildResponse])
-def get_children(
-    db: Session = Depends(get_db),
-    current_representative: models.Representative = Depends(auth.get_current_active_representative)
+CHILD_COLUMNS = [getattr(models.Child, field) for field in schemas.ChildResponse.model_fields]
+
+def child_fields(child: models.Child) -> dict:
+    return {field: getattr(child, field) for field in schemas.ChildResponse.model_fields}
+
+def on_children_written(representative_id: int):
+    """Hook de `bulk`: versión de datos y número de hijos"""
+    async def hook(db: AsyncSession, rows, previous):
+        await changes.mark_changed(db, representative_id, "children", rows, changes.removed_ids(rows, previous))
+        await stats.apply_delta(db, representative_id, children_count=len(rows) - len(previous))
+    return hook
+
+async def get_owned_child(db: AsyncSession, child_id: int, representative_id: int):
+    result = await db.execute(
+        select(models.Child).where(
+            models.Child.id == child_id,
+            models.Child.representative_id == representative_id
+        )
+    )
+    return result.scalars().first()
+
+@router.get("/", response_model=List[schemas.ChildResponse], dependencies=[Depends(query_budget(2))])
+async def get_children(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_read_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
 ):
-    children = db.query(models.Child).filter(
-        models.Child.representative_id == current_representative.id
-    ).all()
-    return children
+    async def build():
+        return await paginate(
+            db, models.Child, list(schemas.ChildResponse.model_fields), page,
+            where=[models.Child.representative_id == current_representative.id],
+            sortable=("id", "full_name")
+        )
+
+    return await conditional_response(request, db, current_representative.id, build)
 
 @router.post("/", response_model=schemas.ChildResponse)
-def create_child(
+async def create_child(
     child: schemas.ChildCreate,
-    db: Session = Depends(get_db),
-    current_representative: models.Representative = Depends(auth.get_current_active_representative)
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
 ):
     db_child = models.Child(**child.dict(), representative_id=current_representative.id)
     db.add(db_child)
-    db.commit()
-    db.refresh(db_child)
+    await db.flush()
+    await changes.mark_changed(db, current_representative.id, "children", [child_fields(db_child)])
+    await stats.apply_delta(db, current_representative.id, children_count=1)
+    await db.commit()
+    await db.refresh(db_child)
     return db_child
 
+@router.post("/bulk", response_model=schemas.ChildBulkResponse)
+async def create_children_bulk(
+    children: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
+):
+    bulk.check_batch_size(len(children))
+    valid, errors = bulk.validate_items(schemas.ChildCreate, children)
+    created, insert_errors = await bulk.bulk_insert(
+        db, models.Child, valid, {"representative_id": current_representative.id}, CHILD_COLUMNS,
+        on_write=on_children_written(current_representative.id)
+    )
+    return {"items": created, "errors": sorted(errors + insert_errors, key=lambda error: error["index"])}
+
+@router.post("/bulk/ndjson", response_model=schemas.ChildBulkResponse)
+async def import_children_ndjson(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
+):
+    items, errors = [], []
+    async for valid, chunk_errors in bulk.read_ndjson(request.stream(), schemas.ChildCreate):
+        created, insert_errors = await bulk.bulk_insert(
+            db, models.Child, valid, {"representative_id": current_representative.id}, CHILD_COLUMNS,
+            on_write=on_children_written(current_representative.id)
+        )
+        items.extend(created)
+        errors.extend(sorted(chunk_errors + insert_errors, key=lambda error: error["index"]))
+    return {"items": items, "errors": errors}
+
+@router.patch("/bulk", response_model=schemas.ChildBulkResponse)
+async def update_children_bulk(
+    children: List[Any] = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
+):
+    bulk.check_batch_size(len(children))
+    valid, errors = bulk.validate_items(schemas.ChildUpdateItem, children, exclude_unset=True)
+    updated, update_errors = await bulk.bulk_update(
+        db, models.Child, models.Child.representative_id, current_representative.id, valid, CHILD_COLUMNS,
+        on_write=on_children_written(current_representative.id)
+    )
+    return {"items": updated, "errors": sorted(errors + update_errors, key=lambda error: error["index"])}
+
+@router.delete("/bulk", response_model=schemas.BulkDeleteResponse)
+async def delete_children_bulk(
+    request: schemas.BulkDeleteRequest,
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
+):
+    bulk.check_batch_size(len(request.ids))
+    deleted, not_found = await bulk.bulk_delete(
+        db, models.Child, models.Child.representative_id, current_representative.id, request.ids,
+        on_write=on_children_written(current_representative.id)
+    )
+    return {"deleted": deleted, "not_found": not_found}
+
 @router.put("/{child_id}", response_model=schemas.ChildResponse)
-def update_child(
+async def update_child(
     child_id: int,
     child: schemas.ChildCreate,
-    db: Session = Depends(get_db),
-    current_representative: models.Representative = Depends(auth.get_current_active_representative)
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
 ):
-    db_child = db.query(models.Child).filter(
-        models.Child.id == child_id,
-        models.Child.representative_id == current_representative.id
-    ).first()
+    db_child = await get_owned_child(db, child_id, current_representative.id)
     if not db_child:
         raise HTTPException(status_code=404, detail="Child not found")
-    
+
     for key, value in child.dict(exclude_unset=True).items():
         setattr(db_child, key, value)
-    
-    db.commit()
-    db.refresh(db_child)
+
+    await changes.mark_changed(db, current_representative.id, "children", [child_fields(db_child)])
+    await db.commit()
+    await db.refresh(db_child)
     return db_child
 
 @router.delete("/{child_id}")
-def delete_child(
+async def delete_child(
     child_id: int,
-    db: Session = Depends(get_db),
-    current_representative: models.Representative = Depends(auth.get_current_active_representative)
+    db: AsyncSession = Depends(get_db),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative)
 ):
-    db_child = db.query(models.Child).filter(
-        models.Child.id == child_id,
-        models.Child.representative_id == current_representative.id
-    ).first()
+    db_child = await get_owned_child(db, child_id, current_representative.id)
     if not db_child:
         raise HTTPException(status_code=404, detail="Child not found")
-    
-    db.delete(db_child)
-    db.commit()
-    return {"message": "Child deleted successfully"} 
\ No newline at end of file
+
+    await db.delete(db_child)
+    await changes.mark_changed(db, current_representative.id, "children", deleted=[child_id])
+    await stats.apply_delta(db, current_representative.id, children_count=-1)
+    await db.commit()
+    return {"message": "Child deleted successfully"}
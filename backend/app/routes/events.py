@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import events
+from ..auth import get_current_representative
+from ..changes import current_version
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/events",
+    tags=["events"]
+)
+
+# Comentario de keep-alive cada EVENTS_HEARTBEAT segundos (proxies y balanceadores cierran conexiones mudas)
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Duración máxima de una conexión; el cliente se reconecta con Last-Event-ID y
+# se vuelve a validar el token (0 = sin límite)
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "900"))
+# Espera que se sugiere al cliente antes de reconectar (campo `retry` de SSE)
+EVENTS_RETRY_MS = int(os.getenv("EVENTS_RETRY_MS", "3000"))
+
+
+async def stream_events(subscription: events.Subscription, version: int, last_event_id: Optional[str]):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + EVENTS_MAX_STREAM_SECONDS if EVENTS_MAX_STREAM_SECONDS > 0 else None
+    yield f"retry: {EVENTS_RETRY_MS}\n\n"
+    yield f"event: ready\nid: {version}\ndata: {json.dumps({'version': version})}\n\n"
+    if last_event_id is not None and last_event_id != str(version):
+        # Hubo cambios mientras estaba desconectado
+        yield events.ChangeEvent(subscription.representative_id, version, None, resync=True).to_sse()
+    while True:
+        timeout = EVENTS_HEARTBEAT
+        if deadline is not None:
+            timeout = min(timeout, deadline - loop.time())
+            if timeout <= 0:
+                break
+        try:
+            change = await asyncio.wait_for(subscription.get(), timeout)
+        except asyncio.TimeoutError:
+            yield ": ping\n\n"
+            continue
+        if change is None:
+            break
+        # Ya incluido en la versión leída al conectar
+        if change.version <= version:
+            continue
+        yield change.to_sse()
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    Respuesta SSE que libera la suscripción al terminar, también si el
+    cliente se va antes de empezar el cuerpo o falla el envío: en esos casos
+    el generador no llega a iterarse y no se puede confiar en su `finally`.
+    """
+
+    def __init__(self, subscription: events.Subscription, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.subscription = subscription
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            events.broker.unsubscribe(self.subscription)
+
+
+@router.get("/")
+async def get_events(
+    access_token: Optional[str] = Query(None, description="Token de acceso (EventSource no permite enviar cabeceras)"),
+    authorization: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Flujo Server-Sent Events con los cambios de datos del representante
+    (productos, hijos, invitaciones y perfil). Cada evento `change` lleva las
+    filas creadas o modificadas y los ids borrados; `resync` indica que hay
+    que volver a pedir el recurso. El token se acepta en la cabecera
+    Authorization o en `access_token`.
+    """
+    scheme, token = get_authorization_scheme_param(authorization)
+    if scheme.lower() != "bearer":
+        token = access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    current_representative = await get_current_representative(token=token, db=db)
+    if not current_representative.is_active:
+        raise HTTPException(status_code=400, detail="Inactive representative")
+
+    try:
+        subscription = events.broker.subscribe(current_representative.id)
+    except events.TooManyConnections as error:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS if error.per_representative else status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Demasiadas conexiones de eventos abiertas",
+            headers={"Retry-After": str(EVENTS_RETRY_MS // 1000 or 1)},
+        )
+
+    # Se suscribe antes de leer la versión para no perder cambios entre ambas
+    # cosas; después se libera la conexión: el flujo no usa la base de datos
+    try:
+        version = await current_version(db, current_representative.id)
+    except BaseException:
+        events.broker.unsubscribe(subscription)
+        raise
+    await db.close()
+
+    return EventStreamResponse(
+        subscription,
+        stream_events(subscription, version, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
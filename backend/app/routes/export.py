@@ -0,0 +1,112 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Literal
+from datetime import date
+import csv
+import io
+import json
+import os
+import zlib
+
+from ..replicas import read_session_factory
+from ..models import Child, Invitation, Product
+from ..schemas import ChildResponse, InvitationResponse, ProductResponse
+from ..auth import Principal, get_current_active_representative
+
+router = APIRouter(
+    prefix="/export",
+    tags=["export"]
+)
+
+# Filas que se traen del cursor del servidor en cada lote
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Recurso -> (modelo, columna dueña, campos exportados)
+EXPORTS = {
+    "products": (Product, Product.representative_id, list(ProductResponse.model_fields)),
+    "children": (Child, Child.representative_id, list(ChildResponse.model_fields)),
+    "invitations": (Invitation, Invitation.sender_id, list(InvitationResponse.model_fields)),
+}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+
+def encode_ndjson(rows, fields) -> str:
+    return "".join(
+        json.dumps(dict(zip(fields, row)), default=_json_default, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows, fields) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+async def stream_rows(resource: str, representative_id: int, format: str, compress: bool):
+    """
+    Genera el archivo de exportación por lotes. Usa su propia sesión (de una
+    réplica si las hay) y un cursor del lado del servidor (yield_per), de modo
+    que la memoria usada no depende del número de filas.
+    """
+    model, owner_column, fields = EXPORTS[resource]
+    encode = encode_ndjson if format == "ndjson" else encode_csv
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    if format == "csv":
+        yield emit(encode_csv([fields], fields))
+
+    query = (
+        select(*[getattr(model, field) for field in fields])
+        .where(owner_column == representative_id)
+        .order_by(model.id)
+        .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    session_factory = await read_session_factory(representative_id)
+    async with session_factory() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            chunk = emit(encode(rows, fields))
+            if chunk:
+                yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/{resource}")
+async def export_resource(
+    resource: Literal["products", "children", "invitations"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = Query(False, description="Comprime la respuesta con gzip"),
+    current_representative: Principal = Depends(get_current_active_representative)
+):
+    """
+    Exporta todos los registros del representante como NDJSON o CSV en streaming
+    """
+    headers = {
+        "Content-Disposition": f'attachment; filename="{resource}.{format}"'
+    }
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        stream_rows(resource, current_representative.id, format, gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
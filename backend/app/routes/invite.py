@@ -1,78 +1,162 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import date, timedelta
+import os
 import secrets
 
-from ..database import get_db
-from ..models import Representative, Invitation
-from ..schemas import InvitationResponse, InvitationCreate
-from ..auth import get_current_active_representative
+from ..database import dialect_insert, get_db
+from ..replicas import get_read_db
+from ..query_debug import query_budget
+from ..models import ArchivedInvitation, Invitation
+from ..schemas import InvitationBulkCreate, InvitationResponse, InvitationCreate
+from .. import archive, bulk, referrals, stats, tasks
+from ..auth import Principal, get_current_active_representative
+from ..pagination import PageParams, page_params, paginate
+from ..changes import mark_changed
+from ..http_cache import conditional_response
 
 router = APIRouter(
     prefix="/invites",
     tags=["invites"]
 )
 
+# Reintentos ante colisiones de códigos antes de abandonar
+INVITATION_CODE_ATTEMPTS = int(os.getenv("INVITATION_CODE_ATTEMPTS", "5"))
+
+# Días durante los que se puede canjear una invitación nueva (0 = no caduca)
+INVITATION_TTL_DAYS = int(os.getenv("INVITATION_TTL_DAYS", "30"))
+
+INVITATION_COLUMNS = [getattr(Invitation, field) for field in InvitationResponse.model_fields]
+
 def generate_invitation_code():
     """Genera un código de invitación único"""
     return secrets.token_urlsafe(8)
 
+def redeemable(code: str):
+    """Condición de una invitación que se puede canjear: sin usar y sin caducar"""
+    return (
+        Invitation.code == code,
+        Invitation.is_used == False,  # noqa: E712
+        or_(Invitation.expires_at.is_(None), Invitation.expires_at >= date.today()),
+    )
+
+async def insert_invitations(db: AsyncSession, sender_id: int, count: int) -> list:
+    """
+    Inserta `count` invitaciones con INSERT ... ON CONFLICT DO NOTHING; los
+    códigos que colisionan con uno existente se regeneran y se reintentan.
+    La restricción única solo cubre la tabla viva: los insertados que ya
+    están en el archivo se borran y también se reintentan. La comprobación
+    va después del INSERT para ver una invitación archivada mientras tanto.
+    No hace commit.
+    """
+    created = []
+    for _ in range(INVITATION_CODE_ATTEMPTS):
+        missing = count - len(created)
+        if not missing:
+            return created
+        today = date.today()
+        expires_at = today + timedelta(days=INVITATION_TTL_DAYS) if INVITATION_TTL_DAYS else None
+        rows = [
+            {
+                "code": generate_invitation_code(), "is_used": False, "created_at": today,
+                "expires_at": expires_at, "sender_id": sender_id,
+            }
+            for _ in range(missing)
+        ]
+        statement = dialect_insert(db)(Invitation).on_conflict_do_nothing(
+            index_elements=[Invitation.code]
+        ).returning(*INVITATION_COLUMNS)
+        for chunk in bulk.chunked(rows):
+            inserted = (await db.execute(statement, chunk)).mappings().all()
+            archived = set()
+            if inserted:
+                archived = set((await db.scalars(
+                    select(ArchivedInvitation.code).where(ArchivedInvitation.code.in_([row["code"] for row in inserted]))
+                )).all())
+            if archived:
+                await db.execute(delete(Invitation).where(Invitation.code.in_(archived)))
+            created.extend(row for row in inserted if row["code"] not in archived)
+    if len(created) < count:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No se pudieron generar códigos de invitación únicos"
+        )
+    return created
+
 @router.post("/", response_model=InvitationResponse)
 async def create_invitation(
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Crea una nueva invitación para compartir
     """
-    # Generar código único
-    code = generate_invitation_code()
-    
-    # Crear la invitación
-    invitation = Invitation(
-        code=code,
-        created_at=datetime.now(),
-        sender_id=current_representative.id
-    )
-    
-    db.add(invitation)
-    db.commit()
-    db.refresh(invitation)
-    
+    invitation, = await insert_invitations(db, current_representative.id, 1)
+    await mark_changed(db, current_representative.id, "invitations", [invitation])
+    await stats.apply_delta(db, current_representative.id, invitations_unused=1)
+    await db.commit()
     return invitation
 
-@router.get("/", response_model=List[InvitationResponse])
-async def get_invitations(
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+@router.post("/bulk", response_model=List[InvitationResponse], status_code=status.HTTP_201_CREATED)
+async def create_invitations_bulk(
+    request: InvitationBulkCreate,
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Obtiene la lista de invitaciones creadas por el representante
+    Genera `count` invitaciones de una vez (campañas); se crean todas o ninguna
     """
-    invitations = db.query(Invitation).filter(
-        Invitation.sender_id == current_representative.id
-    ).all()
-    
+    bulk.check_batch_size(request.count)
+    invitations = await insert_invitations(db, current_representative.id, request.count)
+    await mark_changed(db, current_representative.id, "invitations", invitations)
+    await stats.apply_delta(db, current_representative.id, invitations_unused=len(invitations))
+    await db.commit()
     return invitations
 
+@router.get("/", response_model=List[InvitationResponse], dependencies=[Depends(query_budget(2))])
+async def get_invitations(
+    request: Request,
+    is_used: Optional[bool] = None,
+    include_archived: bool = Query(False, description="Incluye las invitaciones archivadas (usadas hace tiempo o caducadas)"),
+    page: PageParams = Depends(page_params),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Obtiene la lista de invitaciones creadas por el representante, paginada por cursor
+    """
+    def filters(table):
+        conditions = [table.sender_id == current_representative.id]
+        if is_used is not None:
+            conditions.append(table.is_used == is_used)
+        return conditions
+
+    source = archive.with_archived(Invitation, ArchivedInvitation, filters) if include_archived else Invitation
+
+    async def build():
+        return await paginate(
+            db, source, list(InvitationResponse.model_fields), page, where=filters(source)
+        )
+
+    return await conditional_response(request, db, current_representative.id, build)
+
 @router.post("/validate/{code}", response_model=InvitationResponse)
 async def validate_invitation(
     code: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Valida un código de invitación
     """
-    invitation = db.query(Invitation).filter(
-        Invitation.code == code,
-        Invitation.is_used == False
-    ).first()
+    result = await db.execute(select(Invitation).where(*redeemable(code)))
+    invitation = result.scalars().first()
     
     if not invitation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Código de invitación inválido o ya utilizado"
+            detail="Código de invitación inválido, caducado o ya utilizado"
         )
     
     return invitation
@@ -80,28 +164,44 @@ async def validate_invitation(
 @router.post("/use/{code}", response_model=InvitationResponse)
 async def use_invitation(
     code: str,
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Marca una invitación como utilizada
+    Marca una invitación como utilizada por el representante autenticado y lo
+    añade a la red de referidos de quien la envió, si todavía no tiene
+    referidor (ver app/referrals.py). El canje es un único UPDATE
+    condicional, así que de dos peticiones simultáneas solo una lo consigue.
     """
-    invitation = db.query(Invitation).filter(
-        Invitation.code == code,
-        Invitation.is_used == False
-    ).first()
+    result = await db.execute(
+        update(Invitation)
+        .where(*redeemable(code))
+        .values(is_used=True, used_at=date.today(), redeemed_by_id=current_representative.id)
+        .returning(*INVITATION_COLUMNS)
+        .execution_options(synchronize_session=False)
+    )
+    invitation = result.mappings().first()
     
     if not invitation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Código de invitación inválido o ya utilizado"
+            detail="Código de invitación inválido, caducado o ya utilizado"
         )
     
-    # Marcar como utilizada
-    invitation.is_used = True
-    invitation.used_at = datetime.now()
+    # Si no puede entrar en la red (ya referido, ciclo) el canje vale igual
+    await referrals.add_referral(db, invitation["sender_id"], current_representative.id)
+    # El cambio afecta a los datos de quien envió la invitación
+    await mark_changed(db, invitation["sender_id"], "invitations", [invitation])
+    await stats.apply_delta(db, invitation["sender_id"], invitations_used=1, invitations_unused=-1)
+    await db.commit()
     
-    db.commit()
-    db.refresh(invitation)
+    # La analítica del canje no retrasa la respuesta
+    await tasks.enqueue(
+        "invitation_used",
+        invitation_id=invitation["id"],
+        sender_id=invitation["sender_id"],
+        redeemed_by=current_representative.id,
+        used_at=invitation["used_at"].isoformat(),
+    )
     
     return invitation
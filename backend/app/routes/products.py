@@ -1,22 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Optional
 
 from ..database import get_db
-from ..models import Product, Representative
-from ..schemas import ProductCreate, ProductResponse
-from ..auth import get_current_active_representative
+from ..replicas import get_read_db
+from ..query_debug import query_budget
+from ..models import ArchivedProduct, Product
+from ..schemas import (
+    BulkDeleteRequest, BulkDeleteResponse, ProductBulkResponse,
+    ProductCreate, ProductResponse, ProductUpdateItem
+)
+from ..auth import Principal, get_current_active_representative
+from ..pagination import PageParams, page_params, paginate
+from .. import archive, bulk, changes, search, stats
+from ..http_cache import conditional_response
+from ..responses import json_response
 
 router = APIRouter(
     prefix="/products",
     tags=["products"]
 )
 
+PRODUCT_COLUMNS = [getattr(Product, field) for field in ProductResponse.model_fields]
+
+# Límites de resultados de la búsqueda
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+async def record_product_writes(db: AsyncSession, representative_id: int, rows, previous):
+    """
+    Mantiene la versión de datos, el índice de búsqueda y los totales tras
+    escribir productos. `rows` son los productos como quedan y `previous`
+    como estaban; se llama antes del commit.
+    """
+    removed = changes.removed_ids(rows, previous)
+    await changes.mark_changed(db, representative_id, "products", rows, removed)
+    await search.remove_products(db, removed)
+    await search.index_products(db, rows)
+    await stats.apply_delta(db, representative_id, **stats.product_delta(rows, previous))
+
+def on_products_written(representative_id: int):
+    """Hook de `bulk` que llama a record_product_writes en cada bloque"""
+    async def hook(db: AsyncSession, rows, previous):
+        await record_product_writes(db, representative_id, rows, previous)
+    return hook
+
+def product_fields(product: Product) -> dict:
+    return {field: getattr(product, field) for field in ProductResponse.model_fields}
+
+async def get_owned_product(db: AsyncSession, product_id: int, representative_id: int):
+    result = await db.execute(
+        select(Product).where(
+            Product.id == product_id,
+            Product.representative_id == representative_id
+        )
+    )
+    return result.scalars().first()
+
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
-def create_product(
+async def create_product(
     product: ProductCreate,
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Registra un nuevo producto comprado por el representante
@@ -26,37 +72,143 @@ def create_product(
         representative_id=current_representative.id
     )
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
+    await record_product_writes(db, current_representative.id, [product_fields(db_product)], [])
+    await db.commit()
+    await db.refresh(db_product)
     return db_product
 
-@router.get("/", response_model=List[ProductResponse])
-def get_products(
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+@router.post("/bulk", response_model=ProductBulkResponse)
+async def create_products_bulk(
+    products: List[Any] = Body(...),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Registra varios productos en bloques; los elementos inválidos se reportan en `errors`
+    """
+    bulk.check_batch_size(len(products))
+    valid, errors = bulk.validate_items(ProductCreate, products)
+    created, insert_errors = await bulk.bulk_insert(
+        db, Product, valid, {"representative_id": current_representative.id}, PRODUCT_COLUMNS,
+        on_write=on_products_written(current_representative.id)
+    )
+    return {"items": created, "errors": sorted(errors + insert_errors, key=lambda error: error["index"])}
+
+@router.post("/bulk/ndjson", response_model=ProductBulkResponse)
+async def import_products_ndjson(
+    request: Request,
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Importa productos desde un cuerpo NDJSON (un producto por línea) leído en streaming
+    """
+    items, errors = [], []
+    async for valid, chunk_errors in bulk.read_ndjson(request.stream(), ProductCreate):
+        created, insert_errors = await bulk.bulk_insert(
+            db, Product, valid, {"representative_id": current_representative.id}, PRODUCT_COLUMNS,
+            on_write=on_products_written(current_representative.id)
+        )
+        items.extend(created)
+        errors.extend(sorted(chunk_errors + insert_errors, key=lambda error: error["index"]))
+    return {"items": items, "errors": errors}
+
+@router.patch("/bulk", response_model=ProductBulkResponse)
+async def update_products_bulk(
+    products: List[Any] = Body(...),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Actualiza varios productos por id; solo se modifican los campos enviados
+    """
+    bulk.check_batch_size(len(products))
+    valid, errors = bulk.validate_items(ProductUpdateItem, products, exclude_unset=True)
+    updated, update_errors = await bulk.bulk_update(
+        db, Product, Product.representative_id, current_representative.id, valid, PRODUCT_COLUMNS,
+        on_write=on_products_written(current_representative.id)
+    )
+    return {"items": updated, "errors": sorted(errors + update_errors, key=lambda error: error["index"])}
+
+@router.delete("/bulk", response_model=BulkDeleteResponse)
+async def delete_products_bulk(
+    request: BulkDeleteRequest,
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Elimina varios productos por id
+    """
+    bulk.check_batch_size(len(request.ids))
+    deleted, not_found = await bulk.bulk_delete(
+        db, Product, Product.representative_id, current_representative.id, request.ids, PRODUCT_COLUMNS,
+        on_write=on_products_written(current_representative.id)
+    )
+    return {"deleted": deleted, "not_found": not_found}
+
+@router.get("/", response_model=List[ProductResponse], dependencies=[Depends(query_budget(2))])
+async def get_products(
+    request: Request,
+    is_active: Optional[bool] = None,
+    name: Optional[str] = Query(None, description="Prefijo del nombre del producto"),
+    include_archived: bool = Query(False, description="Incluye los productos inactivos archivados"),
+    page: PageParams = Depends(page_params),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Obtiene la lista de productos comprados por el representante
+    Obtiene la lista de productos comprados por el representante, paginada por
+    cursor. Responde 304 si el ETag enviado en If-None-Match sigue vigente.
     """
-    products = db.query(Product).filter(
-        Product.representative_id == current_representative.id
-    ).all()
-    return products
+    def filters(table):
+        conditions = [table.representative_id == current_representative.id]
+        if is_active is not None:
+            conditions.append(table.is_active == is_active)
+        if name:
+            conditions.append(table.name.startswith(name, autoescape=True))
+        return conditions
+
+    source = archive.with_archived(Product, ArchivedProduct, filters) if include_archived else Product
+
+    async def build():
+        return await paginate(
+            db, source, list(ProductResponse.model_fields), page,
+            where=filters(source), sortable=("id", "name")
+        )
+
+    return await conditional_response(request, db, current_representative.id, build)
+
+@router.get("/search", response_model=List[ProductResponse], dependencies=[Depends(query_budget(2))])
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Texto a buscar en nombre y descripción; el último término (el que se está escribiendo) se busca como prefijo"),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Busca productos del representante ordenados por relevancia (pensado para typeahead)
+    """
+    async def build():
+        items = await search.search_products(
+            db, current_representative.id, q, list(ProductResponse.model_fields), limit
+        )
+        return json_response(items)
+
+    return await conditional_response(request, db, current_representative.id, build)
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(
+async def get_product(
     product_id: int,
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Obtiene los detalles de un producto específico
     """
-    product = db.query(Product).filter(
-        Product.id == product_id,
-        Product.representative_id == current_representative.id
-    ).first()
-    
+    product = await get_owned_product(db, product_id, current_representative.id)
+
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,53 +217,73 @@ def get_product(
     return product
 
 @router.put("/{product_id}", response_model=ProductResponse)
-def update_product(
+async def update_product(
     product_id: int,
     product: ProductCreate,
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Actualiza los detalles de un producto
     """
-    db_product = db.query(Product).filter(
-        Product.id == product_id,
-        Product.representative_id == current_representative.id
-    ).first()
-    
+    db_product = await get_owned_product(db, product_id, current_representative.id)
+
     if db_product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado"
         )
-    
+
+    previous = product_fields(db_product)
     for key, value in product.dict().items():
         setattr(db_product, key, value)
-    
-    db.commit()
-    db.refresh(db_product)
+
+    await record_product_writes(db, current_representative.id, [product_fields(db_product)], [previous])
+    await db.commit()
+    await db.refresh(db_product)
     return db_product
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
-    current_representative: Representative = Depends(get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Elimina un producto
     """
-    db_product = db.query(Product).filter(
-        Product.id == product_id,
-        Product.representative_id == current_representative.id
-    ).first()
-    
+    db_product = await get_owned_product(db, product_id, current_representative.id)
+
     if db_product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Producto no encontrado"
         )
-    
-    db.delete(db_product)
-    db.commit()
+
+    await record_product_writes(db, current_representative.id, [], [product_fields(db_product)])
+    await db.delete(db_product)
+    await db.commit()
     return None
+
+@router.post("/{product_id}/restore", response_model=ProductResponse)
+async def restore_product(
+    product_id: int,
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Devuelve a la lista de productos uno que se archivó por estar inactivo;
+    después se puede reactivar o modificar como cualquier otro
+    """
+    product = await archive.restore_product(db, product_id, current_representative.id)
+
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Producto archivado no encontrado"
+        )
+
+    fields = {field: product[field] for field in ProductResponse.model_fields}
+    await changes.mark_changed(db, current_representative.id, "products", [fields])
+    await db.commit()
+    return fields
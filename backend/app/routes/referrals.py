@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from typing import List, Literal
+
+from ..replicas import get_read_db
+from ..query_debug import query_budget
+from ..models import ReferralPath, Representative, RepresentativeStats
+from ..schemas import ReferralResponse, ReferralSummaryResponse, TopReferrerResponse
+from ..auth import Principal, get_current_active_representative
+from ..pagination import PageParams, page_params, paginate
+
+router = APIRouter(
+    prefix="/referrals",
+    tags=["referrals"]
+)
+
+# Niveles de la red que se devuelven por defecto y como máximo
+DEFAULT_REFERRAL_DEPTH = 3
+MAX_REFERRAL_DEPTH = 20
+# Límites del ranking de referidores
+DEFAULT_TOP_LIMIT = 10
+MAX_TOP_LIMIT = 100
+
+@router.get("/me", response_model=ReferralSummaryResponse, dependencies=[Depends(query_budget(3))])
+async def get_referral_summary(
+    max_depth: int = Query(DEFAULT_REFERRAL_DEPTH, ge=1, le=MAX_REFERRAL_DEPTH),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Tamaño de la red de referidos del representante: quién lo refirió, sus
+    referidos directos, el total de la red y cuántos hay en cada nivel hasta
+    `max_depth`
+    """
+    referrer_id = await db.scalar(
+        select(ReferralPath.ancestor_id)
+        .where(ReferralPath.descendant_id == current_representative.id, ReferralPath.depth == 1)
+    )
+    totals = (await db.execute(
+        select(RepresentativeStats.referrals_direct, RepresentativeStats.referrals_total)
+        .where(RepresentativeStats.representative_id == current_representative.id)
+    )).first()
+    levels = await db.execute(
+        select(ReferralPath.depth, func.count())
+        .where(ReferralPath.ancestor_id == current_representative.id, ReferralPath.depth <= max_depth)
+        .group_by(ReferralPath.depth)
+        .order_by(ReferralPath.depth)
+    )
+    direct, total = totals or (0, 0)
+    return {
+        "referrer_id": referrer_id,
+        "direct": direct,
+        "total": total,
+        "by_depth": [{"depth": depth, "count": count} for depth, count in levels],
+    }
+
+@router.get("/tree", response_model=List[ReferralResponse], dependencies=[Depends(query_budget(1))])
+async def get_referral_tree(
+    max_depth: int = Query(DEFAULT_REFERRAL_DEPTH, ge=1, le=MAX_REFERRAL_DEPTH),
+    page: PageParams = Depends(page_params),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Red de referidos hasta `max_depth` niveles, paginada por cursor. Cada
+    fila lleva su nivel y su referidor directo (`referrer_id`) para montar
+    el árbol en el cliente; `sort=depth` la recorre por niveles.
+    """
+    parent = aliased(ReferralPath)
+    tree = (
+        select(
+            ReferralPath.descendant_id.label("id"),
+            Representative.full_name,
+            Representative.country,
+            ReferralPath.depth,
+            parent.ancestor_id.label("referrer_id"),
+        )
+        .join(Representative, Representative.id == ReferralPath.descendant_id)
+        .join(parent, (parent.descendant_id == ReferralPath.descendant_id) & (parent.depth == 1))
+        .where(ReferralPath.ancestor_id == current_representative.id, ReferralPath.depth <= max_depth)
+        .subquery()
+    )
+    return await paginate(db, tree.c, list(ReferralResponse.model_fields), page, sortable=("id", "depth"))
+
+@router.get("/top", response_model=List[TopReferrerResponse], dependencies=[Depends(query_budget(1))])
+async def get_top_referrers(
+    by: Literal["total", "direct"] = Query("total", description="Ordena por toda la red o solo por los referidos directos"),
+    limit: int = Query(DEFAULT_TOP_LIMIT, ge=1, le=MAX_TOP_LIMIT),
+    current_representative: Principal = Depends(get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Ranking de los representantes con más referidos, leído en orden del
+    índice de la tabla de totales
+    """
+    column = RepresentativeStats.referrals_total if by == "total" else RepresentativeStats.referrals_direct
+    result = await db.execute(
+        select(
+            Representative.id,
+            Representative.full_name,
+            RepresentativeStats.referrals_direct,
+            RepresentativeStats.referrals_total,
+        )
+        .join(Representative, Representative.id == RepresentativeStats.representative_id)
+        .where(column > 0)
+        .order_by(column.desc(), RepresentativeStats.representative_id.desc())
+        .limit(limit)
+    )
+    return result.mappings().all()
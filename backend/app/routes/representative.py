@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import timedelta
-from .. import schemas, models, auth
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from jose import JWTError
+import logging
+from .. import schemas, models, auth, passwords, replicas, stats, tasks, tokens
+from ..changes import mark_changed
+from ..http_cache import conditional_response
+from ..responses import FAST_JSON, json_response
+from ..dashboard import load_dashboard
 from ..database import get_db
+from ..replicas import get_read_db
+from ..query_debug import query_budget
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/representatives",
@@ -14,25 +25,51 @@ router = APIRouter(
 @router.post("/token")
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    print(f"Intentando login con email: {form_data.username}")
-    representative = auth.authenticate_representative(db, form_data.username, form_data.password)
+    representative = await auth.authenticate_representative(db, form_data.username, form_data.password)
     if not representative:
-        print("Autenticación fallida")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    print(f"Autenticación exitosa para: {representative.email}")
-    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth.create_access_token(
-        data={"sub": representative.email}, expires_delta=access_token_expires
+    logger.info("login_succeeded", extra={"representative_id": representative.id})
+    return {
+        **tokens.issue_tokens(representative),
+        "user": {
+            "id": representative.id,
+            "email": representative.email
+        }
+    }
+
+@router.post("/token/refresh")
+async def refresh_access_token(
+    request: schemas.RefreshTokenRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Emite un nuevo par de tokens a partir de un token de refresco, sin
+    volver a verificar la contraseña
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
+    try:
+        payload = tokens.decode_token(request.refresh_token, tokens.REFRESH_TOKEN)
+    except JWTError:
+        raise credentials_exception
+
+    # Se consulta el representante para reflejar cambios de email o desactivación
+    representative = await db.get(models.Representative, payload.get("rid"))
+    if representative is None or representative.email != payload["sub"]:
+        raise credentials_exception
+    if not representative.is_active:
+        raise HTTPException(status_code=400, detail="Inactive representative")
     return {
-        "access_token": access_token,
-        "token_type": "bearer",
+        **tokens.issue_tokens(representative),
         "user": {
             "id": representative.id,
             "email": representative.email
@@ -40,14 +77,14 @@ async def login_for_access_token(
     }
 
 @router.post("/", response_model=schemas.RepresentativeResponse)
-def create_representative(representative: schemas.RepresentativeCreate, db: Session = Depends(get_db)):
+async def create_representative(representative: schemas.RepresentativeCreate, db: AsyncSession = Depends(get_db)):
     # Verificar si el email ya existe
-    db_representative = db.query(models.Representative).filter(models.Representative.email == representative.email).first()
+    db_representative = await auth.get_representative(db, representative.email)
     if db_representative:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Crear nuevo representante
-    hashed_password = auth.get_password_hash(representative.password)
+    hashed_password = await passwords.hash_password(representative.password)
     db_representative = models.Representative(
         full_name=representative.full_name,
         birth_date=representative.birth_date,
@@ -57,37 +94,75 @@ def create_representative(representative: schemas.RepresentativeCreate, db: Sess
         hashed_password=hashed_password
     )
     db.add(db_representative)
-    db.commit()
-    db.refresh(db_representative)
+    await db.commit()
+    await db.refresh(db_representative)
+    # Las réplicas aún pueden no tener la cuenta nueva
+    await replicas.stick(db_representative.id)
+
+    # El correo de bienvenida se envía fuera de la petición
+    await tasks.enqueue(
+        "send_email",
+        to=db_representative.email,
+        subject="Bienvenido a CF Incubator",
+        body=f"Hola {db_representative.full_name}, tu cuenta ya está activa.",
+    )
     return db_representative
 
-@router.get("/me", response_model=schemas.DashboardResponse)
-def get_representative_dashboard(
-    current_representative: models.Representative = Depends(auth.get_current_active_representative),
-    db: Session = Depends(get_db)
+@router.get("/me", response_model=schemas.DashboardResponse, dependencies=[Depends(query_budget(2))])
+async def get_representative_dashboard(
+    request: Request,
+    children_limit: Optional[int] = Query(None, ge=0),
+    products_limit: Optional[int] = Query(None, ge=0),
+    invitations_limit: Optional[int] = Query(None, ge=0),
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # Obtener todos los datos del dashboard
-    children = db.query(models.Child).filter(models.Child.representative_id == current_representative.id).all()
-    products = db.query(models.Product).filter(models.Product.representative_id == current_representative.id).all()
-    invitations = db.query(models.Invitation).filter(models.Invitation.sender_id == current_representative.id).all()
-    
-    return {
-        "representative": current_representative,
-        "children": children,
-        "products": products,
-        "invitations": invitations
-    }
+    async def build():
+        # Obtener todos los datos del dashboard en una sola consulta
+        dashboard = await load_dashboard(db, current_representative.id, {
+            "children": children_limit,
+            "products": products_limit,
+            "invitations": invitations_limit,
+        })
+        if dashboard is None:
+            raise HTTPException(status_code=404, detail="Representative not found")
+        if FAST_JSON:
+            # Los dicts de load_dashboard ya tienen la forma de DashboardResponse
+            return json_response(dashboard)
+        # Se devuelve una Response, así que la validación del response_model se hace aquí
+        return JSONResponse(jsonable_encoder(schemas.DashboardResponse.model_validate(dashboard)))
+
+    # Si el cliente ya tiene la versión actual se responde 304 sin consultar el dashboard
+    return await conditional_response(request, db, current_representative.id, build)
+
+@router.get("/me/stats", response_model=schemas.StatsResponse, dependencies=[Depends(query_budget(1))])
+async def get_representative_stats(
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Totales del representante (productos, gasto, hijos e invitaciones) leídos
+    de la tabla de resumen con una sola consulta
+    """
+    return await stats.get_stats(db, current_representative.id)
 
 @router.put("/me", response_model=schemas.RepresentativeResponse)
-def update_representative(
+async def update_representative(
     representative: schemas.RepresentativeBase,
-    current_representative: models.Representative = Depends(auth.get_current_active_representative),
-    db: Session = Depends(get_db)
+    current_representative: auth.Principal = Depends(auth.get_current_active_representative),
+    db: AsyncSession = Depends(get_db)
 ):
+    db_representative = await db.get(models.Representative, current_representative.id)
+    if db_representative is None:
+        raise HTTPException(status_code=404, detail="Representative not found")
+
     # Actualizar datos del representante
     for key, value in representative.dict().items():
-        setattr(current_representative, key, value)
+        setattr(db_representative, key, value)
     
-    db.commit()
-    db.refresh(current_representative)
-    return current_representative 
\ No newline at end of file
+    # Sin filas: el evento pide volver a leer el perfil
+    await mark_changed(db, current_representative.id, "representative")
+    await auth.invalidate_principal(db, current_representative.id, current_representative.email, db_representative.email)
+    await db.commit()
+    await db.refresh(db_representative)
+    return db_representative 
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, ValidationInfo, field_validator
+from typing import Any, Optional, List
 from datetime import date
 
 class UserBase(BaseModel):
@@ -34,6 +34,9 @@ class RepresentativeResponse(RepresentativeBase):
     class Config:
         from_attributes = True
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class ChildBase(BaseModel):
     full_name: str
     birth_date: date
@@ -77,7 +80,9 @@ class InvitationResponse(InvitationBase):
     is_used: bool
     created_at: date
     used_at: Optional[date]
+    expires_at: Optional[date] = None
     sender_id: int
+    redeemed_by_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -91,3 +96,87 @@ class DashboardResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+# Esquemas para operaciones en lote
+class BulkItemError(BaseModel):
+    index: int
+    detail: Any
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+class BulkDeleteResponse(BaseModel):
+    deleted: List[int]
+    not_found: List[int]
+
+class PartialUpdateItem(BaseModel):
+    """
+    Elemento de una actualización parcial: los campos omitidos no cambian y
+    un null explícito es un error del elemento, porque las columnas no lo admiten
+    """
+    @field_validator("*", mode="before")
+    @classmethod
+    def reject_null(cls, value, info: ValidationInfo):
+        if value is None and info.field_name != "id":
+            raise ValueError("No admite null; omita el campo para no modificarlo")
+        return value
+
+class ProductUpdateItem(PartialUpdateItem):
+    id: int
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    stock: Optional[int] = None
+    is_active: Optional[bool] = None
+
+class ProductBulkResponse(BaseModel):
+    items: List[ProductResponse]
+    errors: List[BulkItemError]
+
+class ChildUpdateItem(PartialUpdateItem):
+    id: int
+    full_name: Optional[str] = None
+    birth_date: Optional[date] = None
+    country: Optional[str] = None
+
+class ChildBulkResponse(BaseModel):
+    items: List[ChildResponse]
+    errors: List[BulkItemError]
+
+class InvitationBulkCreate(BaseModel):
+    count: int = Field(..., ge=1)
+
+class StatsResponse(BaseModel):
+    product_count: int
+    active_product_count: int
+    total_spend: float
+    children_count: int
+    invitations_used: int
+    invitations_unused: int
+    invitations_expired: int
+    referrals_direct: int
+    referrals_total: int
+
+# Esquemas de la red de referidos
+class ReferralLevel(BaseModel):
+    depth: int
+    count: int
+
+class ReferralSummaryResponse(BaseModel):
+    referrer_id: Optional[int]
+    direct: int
+    total: int
+    by_depth: List[ReferralLevel]
+
+class ReferralResponse(BaseModel):
+    id: int
+    full_name: str
+    country: Optional[str]
+    depth: int
+    referrer_id: int
+
+class TopReferrerResponse(BaseModel):
+    id: int
+    full_name: str
+    referrals_direct: int
+    referrals_total: int
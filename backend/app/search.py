@@ -0,0 +1,173 @@
+import os
+import re
+from typing import Iterable, List, Sequence, Tuple
+
+from sqlalchemy import Integer, column, func, literal_column, not_, select, table, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Product
+
+# Máximo de términos que se usan de una búsqueda
+MAX_SEARCH_TERMS = 8
+
+# Coincidencias candidatas: las SEARCH_CANDIDATES más relevantes por texto
+# (bm25 en SQLite, ts_rank en PostgreSQL) son las únicas que se vuelven a
+# ordenar por coincidencia en el nombre y longitud o similitud
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "500"))
+
+# Longitud máxima de los prefijos indexados en FTS5 (ver _CREATE_FTS)
+MAX_INDEXED_PREFIX = 6
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+# En SQLite la búsqueda usa una tabla FTS5 cuyo rowid es el id del producto
+# (la crea la migración 0001). El representante se indexa como un token más
+# (`owner`) para que FTS5 intersecte directamente con sus productos. Los
+# índices de prefijos evitan recorrer todo el índice en el typeahead
+# (prefijos de hasta 6 caracteres)
+_CREATE_FTS = (
+    "CREATE VIRTUAL TABLE product_search USING fts5("
+    "owner, name, description, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')"
+)
+_product_search = table("product_search", column("rowid", Integer), column("rank"))
+
+# En PostgreSQL, columna generada de products (migración 0009) con el nombre
+# con peso A y la descripción con peso B; no está en el modelo porque en
+# SQLite no existe
+_search_document = literal_column("products.search_document", TSVECTOR)
+
+
+def _owner_token(representative_id: int) -> str:
+    return f"r{representative_id}"
+
+
+def search_terms(query: str) -> List[Tuple[str, bool]]:
+    """
+    Términos de la búsqueda y si se buscan como prefijo. Un solo carácter
+    nunca es prefijo (coincidiría con casi todo). El último término (el que
+    se está escribiendo) siempre lo es; los anteriores solo si caben en el
+    índice de prefijos, porque los más largos suelen ser palabras completas.
+    """
+    terms = _TERM.findall(query.lower())[:MAX_SEARCH_TERMS]
+    return [
+        (term, len(term) > 1 and (index == len(terms) - 1 or len(term) <= MAX_INDEXED_PREFIX))
+        for index, term in enumerate(terms)
+    ]
+
+
+def rebuild_search_index(connection):
+    """Vuelve a crear la tabla FTS5 desde la tabla de productos (solo SQLite; conexión síncrona)"""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.exec_driver_sql("DROP TABLE IF EXISTS product_search")
+    connection.exec_driver_sql(_CREATE_FTS)
+    connection.exec_driver_sql(
+        "INSERT INTO product_search (rowid, owner, name, description) "
+        "SELECT id, 'r' || representative_id, name, description FROM products"
+    )
+
+
+def _is_sqlite(db: AsyncSession) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+async def index_products(db: AsyncSession, rows: Iterable):
+    """
+    Sincroniza el índice con los productos creados o modificados. `rows` son
+    dicts (o mappings) con id, name, description y representative_id. En
+    PostgreSQL no hace nada: el índice es una expresión sobre la tabla.
+    """
+    if not _is_sqlite(db):
+        return
+    params = [
+        {
+            "id": row["id"],
+            "owner": _owner_token(row["representative_id"]),
+            "name": row["name"],
+            "description": row["description"],
+        }
+        for row in rows
+    ]
+    if not params:
+        return
+    await remove_products(db, [values["id"] for values in params])
+    await db.execute(
+        text("INSERT INTO product_search (rowid, owner, name, description) VALUES (:id, :owner, :name, :description)"),
+        params
+    )
+
+
+async def remove_products(db: AsyncSession, ids: Sequence[int]):
+    if not ids or not _is_sqlite(db):
+        return
+    await db.execute(text("DELETE FROM product_search WHERE rowid = :id"), [{"id": id_} for id_ in ids])
+
+
+async def search_products(
+    db: AsyncSession,
+    representative_id: int,
+    query: str,
+    columns: Sequence[str],
+    limit: int
+) -> List[dict]:
+    """
+    Busca productos del representante por nombre y descripción. Deben
+    aparecer todos los términos; el último se trata como prefijo (typeahead).
+    Primero van las coincidencias en el nombre y, dentro de ellas, los
+    nombres más cortos. Devuelve `columns` con los tipos del modelo.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if _is_sqlite(db):
+        # Los términos solo contienen caracteres de palabra, así que se pueden citar sin escapar
+        phrases = " AND ".join(f'"{term}"*' if prefix else f'"{term}"' for term, prefix in terms)
+        match = f'owner : "{_owner_token(representative_id)}" AND {{name description}} : ({phrases})'
+        # `rank` es bm25(); highlight() marca los términos encontrados en el nombre (columna 1)
+        candidates = (
+            select(
+                _product_search.c.rowid.label("id"),
+                literal_column("instr(highlight(product_search, 1, char(1), ''), char(1)) = 0").label("tier"),
+            )
+            .where(text("product_search MATCH :match").bindparams(match=match))
+            .order_by(_product_search.c.rank)
+            .limit(SEARCH_CANDIDATES)
+            .subquery()
+        )
+        statement = (
+            select(*[getattr(Product, name) for name in columns])
+            .join_from(candidates, Product, Product.id == candidates.c.id)
+            .order_by(candidates.c.tier, func.length(Product.name), Product.id)
+            .limit(limit)
+        )
+    else:
+        tsquery = func.to_tsquery(
+            literal_column("'simple'"), " & ".join(f"{term}:*" if prefix else term for term, prefix in terms)
+        )
+        words = " ".join(term for term, _ in terms)
+        contains = "%" + words.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        in_name = Product.name.ilike(contains, escape="\\")
+        # ts_rank lee la columna guardada; ts_filter se queda con los términos del nombre (peso A)
+        rank = func.ts_rank(_search_document, tsquery)
+        name_match = func.ts_filter(_search_document, literal_column("'{a}'")).op("@@")(tsquery) | in_name
+        candidates = (
+            select(*Product.__table__.columns, not_(name_match).label("tier"))
+            .where(
+                Product.representative_id == representative_id,
+                _search_document.op("@@")(tsquery) | in_name,
+            )
+            .order_by(rank.desc())
+            .limit(SEARCH_CANDIDATES)
+            .subquery()
+        )
+        statement = (
+            select(*[candidates.c[name] for name in columns])
+            .order_by(candidates.c.tier, func.length(candidates.c.name), candidates.c.id)
+            .limit(limit)
+        )
+
+    result = await db.execute(statement)
+    return [dict(row) for row in result.mappings().all()]
@@ -0,0 +1,100 @@
+"""
+Punto de entrada de producción: `python -m app.server`.
+
+Arranca WEB_CONCURRENCY procesos de uvicorn (por defecto, uno por núcleo
+disponible según la afinidad y la cuota de CPU del contenedor, sin pasar
+de DEFAULT_MAX_WORKERS ni de DB_MAX_CONNECTIONS) bajo su supervisor, que reinicia los workers caídos. Con
+SIGTERM los workers dejan de aceptar conexiones, esperan hasta
+GRACEFUL_SHUTDOWN_TIMEOUT segundos a que terminen las peticiones en curso y
+ejecutan el cierre del lifespan (cola de tareas, pools de conexiones).
+
+Cada worker es un proceso independiente: el pool de conexiones, la caché de
+respuestas, los límites de tasa y la cola de tareas en memoria son por
+worker. Para repartir un presupuesto de conexiones a la base de datos entre
+todos, ver DB_MAX_CONNECTIONS en app/database.py; un WEB_CONCURRENCY
+explícito mayor que el presupuesto no arranca.
+"""
+import math
+import os
+
+import uvicorn
+
+# Presupuesto de conexiones de app/database.py; se lee aquí para no crear los
+# engines en el proceso supervisor
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+# Tope de workers cuando no se fija WEB_CONCURRENCY
+DEFAULT_MAX_WORKERS = int(os.getenv("DEFAULT_MAX_WORKERS", "4"))
+
+
+def _cgroup_cpu_quota():
+    """Núcleos que permite la cuota de CPU del cgroup (v2 o v1), o None si no hay cuota"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()[:2]
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as file:
+                quota = file.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as file:
+                period = file.read().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    return min(cpus, quota) if quota else cpus
+
+
+def default_workers() -> int:
+    workers = min(available_cpus(), DEFAULT_MAX_WORKERS)
+    if DB_MAX_CONNECTIONS:
+        # Cada worker necesita al menos una conexión del presupuesto
+        workers = min(workers, DB_MAX_CONNECTIONS)
+    return max(1, workers)
+
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0")) or default_workers()
+GRACEFUL_SHUTDOWN_TIMEOUT = int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "25"))
+KEEP_ALIVE_TIMEOUT = int(os.getenv("KEEP_ALIVE_TIMEOUT", "65"))
+# Reinicia cada worker tras este número de peticiones (0 = nunca); el margen evita que reinicien todos a la vez
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def main():
+    if DB_MAX_CONNECTIONS and WEB_CONCURRENCY > DB_MAX_CONNECTIONS:
+        raise SystemExit(
+            f"WEB_CONCURRENCY={WEB_CONCURRENCY} supera DB_MAX_CONNECTIONS={DB_MAX_CONNECTIONS}: "
+            "cada worker necesita al menos una conexión"
+        )
+    # Los workers leen WEB_CONCURRENCY para repartir el pool de conexiones y el hash de contraseñas
+    os.environ["WEB_CONCURRENCY"] = str(WEB_CONCURRENCY)
+    uvicorn.run(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_TIMEOUT,
+        timeout_keep_alive=KEEP_ALIVE_TIMEOUT,
+        limit_max_requests=MAX_REQUESTS or None,
+        limit_max_requests_jitter=MAX_REQUESTS_JITTER,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        # El registro de accesos lo escribe MetricsMiddleware (logger app.access)
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
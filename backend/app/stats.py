@@ -0,0 +1,129 @@
+"""
+Totales por representante (productos, gasto, hijos, invitaciones, referidos).
+
+Las rutas que escriben aplican incrementos con `apply_delta` dentro de la
+misma transacción, así que leer los totales es una consulta por clave
+primaria. Las filas archivadas (app/archive.py) se siguen contando. Las
+invitaciones sin usar no incluyen las caducadas, que se cuentan aparte: al
+recalcular se clasifican por fecha y, en los incrementos, pasan de un total
+al otro cuando el archivado las mueve (poco después de caducar). Para
+rellenar o corregir la tabla:
+
+    python -m app.stats            # todos los representantes
+    python -m app.stats 12 15      # solo algunos
+"""
+import sys
+from datetime import date
+from typing import Iterable, Optional, Sequence
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import dialect_insert
+from .models import (
+    ArchivedInvitation, ArchivedProduct, Child, Invitation, Product, ReferralPath, Representative, RepresentativeStats,
+)
+
+STAT_FIELDS = (
+    "product_count",
+    "active_product_count",
+    "total_spend",
+    "children_count",
+    "invitations_used",
+    "invitations_unused",
+    "invitations_expired",
+    "referrals_direct",
+    "referrals_total",
+)
+
+
+def _product_totals(rows: Iterable) -> dict:
+    totals = {"product_count": 0, "active_product_count": 0, "total_spend": 0.0}
+    for row in rows:
+        totals["product_count"] += 1
+        totals["active_product_count"] += 1 if row["is_active"] else 0
+        totals["total_spend"] += (row["price"] or 0) * (row["stock"] or 0)
+    return totals
+
+
+def product_delta(rows: Sequence, previous: Sequence) -> dict:
+    """Incremento de los totales de productos entre `previous` (antes) y `rows` (después)"""
+    after, before = _product_totals(rows), _product_totals(previous)
+    return {field: after[field] - before[field] for field in after}
+
+
+async def apply_delta(db: AsyncSession, representative_id: int, **deltas):
+    """Suma los incrementos a los totales del representante. No hace commit"""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    statement = dialect_insert(db)(RepresentativeStats).values(
+        representative_id=representative_id,
+        **{field: deltas.get(field, 0) for field in STAT_FIELDS}
+    )
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[RepresentativeStats.representative_id],
+        set_={field: getattr(RepresentativeStats, field) + value for field, value in deltas.items()},
+    ))
+
+
+async def get_stats(db: AsyncSession, representative_id: int) -> dict:
+    row = (await db.execute(
+        select(*[getattr(RepresentativeStats, field) for field in STAT_FIELDS])
+        .where(RepresentativeStats.representative_id == representative_id)
+    )).first()
+    if row is None:
+        return {field: 0 for field in STAT_FIELDS}
+    return dict(zip(STAT_FIELDS, row))
+
+
+def rebuild_query(representative_ids: Optional[Sequence[int]] = None):
+    """INSERT ... SELECT que recalcula los totales desde las tablas de datos"""
+    def scalar(column, *where):
+        return select(column).where(*where).scalar_subquery()
+
+    def with_archived(model, archive_model, *columns):
+        return union_all(*[
+            select(*[getattr(table, column) for column in columns]) for table in (model, archive_model)
+        ]).subquery()
+
+    products = with_archived(Product, ArchivedProduct, "representative_id", "is_active", "price", "stock")
+    invitations = with_archived(Invitation, ArchivedInvitation, "sender_id", "is_used", "expires_at")
+    unused = func.coalesce(invitations.c.is_used, False) == False  # noqa: E712
+    expired = invitations.c.expires_at < date.today()
+
+    representative = Representative.id
+    query = select(
+        representative,
+        scalar(func.count(), products.c.representative_id == representative),
+        scalar(func.count(), products.c.representative_id == representative, products.c.is_active == True),  # noqa: E712
+        scalar(func.coalesce(func.sum(products.c.price * products.c.stock), 0.0), products.c.representative_id == representative),
+        scalar(func.count(Child.id), Child.representative_id == representative),
+        scalar(func.count(), invitations.c.sender_id == representative, invitations.c.is_used == True),  # noqa: E712
+        scalar(func.count(), invitations.c.sender_id == representative, unused, invitations.c.expires_at.is_(None) | ~expired),
+        scalar(func.count(), invitations.c.sender_id == representative, unused, expired),
+        scalar(func.count(), ReferralPath.ancestor_id == representative, ReferralPath.depth == 1),
+        scalar(func.count(), ReferralPath.ancestor_id == representative),
+    )
+    if representative_ids:
+        query = query.where(representative.in_(representative_ids))
+    return insert(RepresentativeStats).from_select(["representative_id", *STAT_FIELDS], query)
+
+
+def rebuild_stats(connection, representative_ids: Optional[Sequence[int]] = None):
+    """Recalcula los totales (todos o los de `representative_ids`) en una conexión síncrona"""
+    statement = delete(RepresentativeStats)
+    if representative_ids:
+        statement = statement.where(RepresentativeStats.representative_id.in_(representative_ids))
+    connection.execute(statement)
+    connection.execute(rebuild_query(representative_ids))
+
+
+if __name__ == "__main__":
+    from .database import create_tables, engine
+
+    create_tables()
+    ids = [int(value) for value in sys.argv[1:]]
+    with engine.begin() as connection:
+        rebuild_stats(connection, ids or None)
+    print(f"Totales recalculados para {len(ids) if ids else 'todos los'} representantes")
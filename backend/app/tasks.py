@@ -0,0 +1,305 @@
+"""
+Cola de tareas diferidas dentro del proceso.
+
+Las rutas encolan con `await tasks.enqueue("nombre", **datos)` el trabajo que
+el cliente no necesita esperar; un grupo de workers asyncio lo ejecuta con
+concurrencia acotada y reintentos con espera exponencial. Las tareas se
+registran con el decorador `@task("nombre")` (ver app/jobs.py) y reciben
+los datos como argumentos con nombre, así que deben ser serializables en JSON.
+
+Backends (TASK_BACKEND):
+- memory: cola en memoria; lo pendiente se pierde al reiniciar.
+- sql: tabla task_jobs de la base de datos de la aplicación (SQLite en
+  local); sobrevive a reinicios y la comparten todos los workers.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from .database import AsyncSessionLocal
+from .metrics import Counter, Gauge, Histogram
+from .models import TaskJob
+
+logger = logging.getLogger(__name__)
+
+TASK_BACKEND = os.getenv("TASK_BACKEND", "memory")
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "4"))
+TASK_QUEUE_SIZE = int(os.getenv("TASK_QUEUE_SIZE", "10000"))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "5"))
+TASK_RETRY_DELAY = float(os.getenv("TASK_RETRY_DELAY", "2"))
+TASK_POLL_INTERVAL = float(os.getenv("TASK_POLL_INTERVAL", "1"))
+TASK_VISIBILITY_TIMEOUT = float(os.getenv("TASK_VISIBILITY_TIMEOUT", "300"))
+TASK_SHUTDOWN_TIMEOUT = float(os.getenv("TASK_SHUTDOWN_TIMEOUT", "10"))
+
+TASKS = Counter("tasks_total", "Tareas diferidas por resultado", ("task", "status"))
+TASK_DURATION = Histogram("task_duration_seconds", "Duración de cada ejecución de una tarea", ("task",))
+TASKS_RUNNING = Gauge("tasks_running", "Tareas ejecutándose ahora mismo")
+
+Handler = Callable[..., Awaitable[None]]
+
+_handlers: Dict[str, Handler] = {}
+
+
+def task(name: str):
+    """Registra una corrutina como tarea diferida con el nombre dado"""
+    def register(function: Handler) -> Handler:
+        _handlers[name] = function
+        return function
+    return register
+
+
+@dataclass
+class Job:
+    name: str
+    payload: dict
+    attempts: int = 0
+    id: Optional[int] = None
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TaskBackend:
+    """
+    Almacén de tareas pendientes. `pop` espera hasta que haya una lista para
+    ejecutar y cuenta el intento en `job.attempts`.
+    """
+
+    async def push(self, job: Job) -> bool:
+        """Guarda la tarea; devuelve False si se descarta por falta de espacio"""
+        raise NotImplementedError
+
+    async def pop(self) -> Job:
+        raise NotImplementedError
+
+    async def ack(self, job: Job):
+        raise NotImplementedError
+
+    async def retry(self, job: Job, delay: float, error: str):
+        raise NotImplementedError
+
+    async def bury(self, job: Job, error: str):
+        """Marca la tarea como fallida definitivamente"""
+        raise NotImplementedError
+
+    def depth(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryTaskBackend(TaskBackend):
+    def __init__(self, maxsize: int = TASK_QUEUE_SIZE):
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=maxsize)
+        self.delayed = 0
+
+    async def push(self, job: Job) -> bool:
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def pop(self) -> Job:
+        job = await self.queue.get()
+        job.attempts += 1
+        return job
+
+    async def ack(self, job: Job):
+        pass
+
+    async def retry(self, job: Job, delay: float, error: str):
+        def requeue():
+            self.delayed -= 1
+            if not self.queue.full():
+                self.queue.put_nowait(job)
+            else:
+                TASKS.inc(job.name, "dropped")
+                logger.warning("task_dropped", extra={"task": job.name, "reason": "queue_full"})
+        self.delayed += 1
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def bury(self, job: Job, error: str):
+        pass
+
+    def depth(self) -> int:
+        return self.queue.qsize() + self.delayed
+
+
+class SQLTaskBackend(TaskBackend):
+    """
+    Backend persistente sobre la tabla task_jobs. Una tarea reclamada queda
+    bloqueada durante TASK_VISIBILITY_TIMEOUT; si el proceso muere antes de
+    terminarla, otro worker la vuelve a tomar al expirar el bloqueo.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, poll_interval: float = TASK_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self._depth = 0
+
+    async def push(self, job: Job) -> bool:
+        now = _utcnow()
+        async with self.session_factory() as db:
+            db.add(TaskJob(
+                name=job.name, payload=json.dumps(job.payload), status="pending",
+                attempts=job.attempts, run_after=now, created_at=now,
+            ))
+            await db.commit()
+        self._depth += 1
+        return True
+
+    async def _claim(self) -> Optional[Job]:
+        now = _utcnow()
+        ready = or_(
+            and_(TaskJob.status == "pending", TaskJob.run_after <= now),
+            and_(TaskJob.status == "running", TaskJob.locked_until < now),
+        )
+        async with self.session_factory() as db:
+            job_id = await db.scalar(select(TaskJob.id).where(ready).order_by(TaskJob.id).limit(1))
+            if job_id is None:
+                # Sin trabajo: se aprovecha para actualizar la métrica de profundidad
+                self._depth = await db.scalar(
+                    select(func.count()).select_from(TaskJob).where(TaskJob.status == "pending")
+                )
+                return None
+            # La condición se repite en el UPDATE: si otro worker la tomó antes, no afecta a ninguna fila
+            row = (await db.execute(
+                update(TaskJob)
+                .where(TaskJob.id == job_id, ready)
+                .values(
+                    status="running",
+                    attempts=TaskJob.attempts + 1,
+                    locked_until=now + timedelta(seconds=TASK_VISIBILITY_TIMEOUT),
+                )
+                .returning(TaskJob.id, TaskJob.name, TaskJob.payload, TaskJob.attempts)
+            )).first()
+            await db.commit()
+        if row is None:
+            return None
+        return Job(name=row.name, payload=json.loads(row.payload), attempts=row.attempts, id=row.id)
+
+    async def pop(self) -> Job:
+        while True:
+            job = await self._claim()
+            if job is not None:
+                return job
+            await asyncio.sleep(self.poll_interval)
+
+    async def ack(self, job: Job):
+        async with self.session_factory() as db:
+            await db.execute(delete(TaskJob).where(TaskJob.id == job.id))
+            await db.commit()
+
+    async def retry(self, job: Job, delay: float, error: str):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(TaskJob).where(TaskJob.id == job.id).values(
+                    status="pending", last_error=error,
+                    run_after=_utcnow() + timedelta(seconds=delay), locked_until=None,
+                )
+            )
+            await db.commit()
+
+    async def bury(self, job: Job, error: str):
+        async with self.session_factory() as db:
+            await db.execute(
+                update(TaskJob).where(TaskJob.id == job.id).values(
+                    status="failed", last_error=error, locked_until=None,
+                )
+            )
+            await db.commit()
+
+    def depth(self) -> int:
+        return self._depth
+
+
+class TaskQueue:
+    def __init__(self, backend: TaskBackend, workers: int = TASK_WORKERS, max_attempts: int = TASK_MAX_ATTEMPTS):
+        self.backend = backend
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._workers: List[asyncio.Task] = []
+        self._running = 0
+
+    async def enqueue(self, name: str, **payload):
+        if name not in _handlers:
+            raise KeyError(f"Tarea no registrada: {name}")
+        if await self.backend.push(Job(name=name, payload=payload)):
+            TASKS.inc(name, "enqueued")
+        else:
+            TASKS.inc(name, "dropped")
+            logger.warning("task_dropped", extra={"task": name, "reason": "queue_full"})
+
+    async def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = TASK_SHUTDOWN_TIMEOUT):
+        """Deja terminar las tareas en curso (hasta `timeout`) y para los workers"""
+        deadline = time.monotonic() + timeout
+        while self._running and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def depth(self) -> int:
+        return self.backend.depth()
+
+    async def _work(self):
+        while True:
+            job = await self.backend.pop()
+            self._running += 1
+            TASKS_RUNNING.inc()
+            try:
+                await self._run(job)
+            finally:
+                self._running -= 1
+                TASKS_RUNNING.dec()
+
+    async def _run(self, job: Job):
+        handler = _handlers.get(job.name)
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise KeyError(f"Tarea no registrada: {job.name}")
+            await handler(**job.payload)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if job.attempts < self.max_attempts and handler is not None:
+                delay = TASK_RETRY_DELAY * 2 ** (job.attempts - 1)
+                TASKS.inc(job.name, "retried")
+                logger.warning("task_retry", extra={"task": job.name, "attempt": job.attempts, "error": error})
+                await self.backend.retry(job, delay, error)
+            else:
+                TASKS.inc(job.name, "failed")
+                logger.exception("task_failed", extra={"task": job.name, "attempt": job.attempts})
+                await self.backend.bury(job, error)
+        else:
+            TASKS.inc(job.name, "succeeded")
+            await self.backend.ack(job)
+        finally:
+            TASK_DURATION.observe(time.perf_counter() - start, job.name)
+
+
+def _backend_from_env() -> TaskBackend:
+    if TASK_BACKEND == "sql":
+        return SQLTaskBackend()
+    return MemoryTaskBackend()
+
+
+queue = TaskQueue(_backend_from_env())
+
+TASK_QUEUE_DEPTH = Gauge("task_queue_depth", "Tareas pendientes (incluye reintentos programados)", function=lambda: queue.depth())
+
+
+async def enqueue(name: str, **payload):
+    await queue.enqueue(name, **payload)
@@ -0,0 +1,132 @@
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from .cache import TTLCache
+
+# Configuración de los tokens
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+ACCESS_TOKEN = "access"
+REFRESH_TOKEN = "refresh"
+
+# Clave usada en desarrollo si no se configura ninguna
+DEFAULT_KID = "default"
+_DEVELOPMENT_SECRET = "tu_clave_secreta_aqui"
+
+
+class KeyRing:
+    """
+    Conjunto de claves de firma identificadas por `kid`. Los tokens se firman
+    con la clave activa y se verifican con la clave indicada en su cabecera,
+    lo que permite rotar claves sin invalidar los tokens emitidos.
+    """
+
+    def __init__(self, keys: Dict[str, str], active_kid: Optional[str] = None):
+        if not keys:
+            raise ValueError("Se necesita al menos una clave de firma")
+        self.keys = dict(keys)
+        self.active_kid = active_kid or next(iter(self.keys))
+        if self.active_kid not in self.keys:
+            raise ValueError(f"La clave activa '{self.active_kid}' no existe")
+
+    @classmethod
+    def from_env(cls) -> "KeyRing":
+        """
+        JWT_KEYS="kid1:secreto1,kid2:secreto2" y JWT_ACTIVE_KID=kid2. Sin
+        JWT_KEYS se usa SECRET_KEY como única clave.
+        """
+        keys = {}
+        for entry in os.getenv("JWT_KEYS", "").split(","):
+            kid, _, secret = entry.strip().partition(":")
+            if kid and secret:
+                keys[kid] = secret
+        if not keys:
+            keys[DEFAULT_KID] = os.getenv("SECRET_KEY", _DEVELOPMENT_SECRET)
+        return cls(keys, os.getenv("JWT_ACTIVE_KID"))
+
+    def signing_key(self) -> Tuple[str, str]:
+        return self.active_kid, self.keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]) -> str:
+        if kid is None:
+            # Tokens emitidos antes de la rotación de claves
+            kid = DEFAULT_KID if DEFAULT_KID in self.keys else self.active_kid
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise JWTError("Clave de firma desconocida")
+
+
+keyring = KeyRing.from_env()
+
+# Tokens ya verificados, guardados durante el resto de su vigencia
+_verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=None)
+
+
+def encode_token(claims: dict, expires_delta: timedelta, token_type: str = ACCESS_TOKEN) -> str:
+    now = datetime.now(timezone.utc)
+    to_encode = claims.copy()
+    to_encode.update({"exp": now + expires_delta, "iat": now, "typ": token_type})
+    kid, key = keyring.signing_key()
+    return jwt.encode(to_encode, key, algorithm=ALGORITHM, headers={"kid": kid})
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    return encode_token(data, expires_delta or timedelta(minutes=15), ACCESS_TOKEN)
+
+
+def representative_claims(representative) -> dict:
+    """Claims que permiten autenticar sin consultar la base de datos"""
+    return {
+        "sub": representative.email,
+        "rid": representative.id,
+        "act": representative.is_active,
+    }
+
+
+def issue_tokens(representative) -> dict:
+    """Emite un token de acceso y uno de refresco para el representante"""
+    claims = representative_claims(representative)
+    return {
+        "access_token": encode_token(claims, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), ACCESS_TOKEN),
+        "refresh_token": encode_token(
+            {**claims, "jti": secrets.token_urlsafe(16)},
+            timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            REFRESH_TOKEN,
+        ),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+def decode_token(token: str, token_type: str = ACCESS_TOKEN) -> dict:
+    """
+    Verifica firma y expiración. El resultado se cachea hasta que el token
+    expira, así que las peticiones siguientes con el mismo token no vuelven
+    a verificarlo. Lanza JWTError si el token no es válido.
+    """
+    cache_key = (token_type, token)
+    claims = _verified_tokens.get(cache_key)
+    if claims is not None:
+        if claims["exp"] > time.time():
+            return claims
+        _verified_tokens.delete(cache_key)
+
+    header = jwt.get_unverified_header(token)
+    claims = jwt.decode(token, keyring.verification_key(header.get("kid")), algorithms=[ALGORITHM])
+    # Los tokens antiguos no tienen `typ` y solo pueden ser de acceso
+    if claims.get("typ", ACCESS_TOKEN) != token_type or claims.get("sub") is None:
+        raise JWTError("Tipo de token inválido")
+
+    remaining = claims["exp"] - time.time()
+    if remaining > 0:
+        _verified_tokens.set(cache_key, claims, ttl=remaining)
+    return claims
@@ -0,0 +1,277 @@
+"""
+Benchmark de latencia y throughput de la API.
+
+Uso (desde backend/):
+
+    python -m benchmarks.run --mode inprocess --requests 500 --concurrency 20
+    python -m benchmarks.run --mode uvicorn --output results.json --baseline baseline.json
+
+Siembra una base de datos con el volumen indicado, lanza peticiones
+concurrentes contra cada endpoint y muestra throughput y p50/p95/p99. Con
+--output guarda el resultado en JSON y con --baseline lo compara con una
+ejecución anterior.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+DEFAULT_DATABASE_URL = "sqlite:///./benchmark.db"
+ENDPOINTS = ("token", "dashboard", "products", "use_invitation")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCHMARK_DATABASE_URL", DEFAULT_DATABASE_URL))
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="Workers de uvicorn (modo uvicorn)")
+    parser.add_argument("--representatives", type=int, default=10)
+    parser.add_argument("--children", type=int, default=3, help="Hijos por representante")
+    parser.add_argument("--products", type=int, default=200, help="Productos por representante")
+    parser.add_argument("--invitations", type=int, default=200, help="Invitaciones por representante")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--no-seed", action="store_true", help="Reutiliza los datos existentes")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="Resultados JSON anteriores con los que comparar")
+    return parser.parse_args(argv)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], statuses: Dict[int, int], elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def drive(client, total: int, concurrency: int, make_request: Callable) -> dict:
+    """Lanza `total` peticiones con `concurrency` clientes simultáneos"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < total:
+            number = issued
+            issued += 1
+            start = time.perf_counter()
+            response = await make_request(client, number)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def build_scenarios(
+    representative_count: int, codes: List[str], tokens: List[str], redeemer_tokens: List[str]
+) -> Dict[str, Callable]:
+    from .seed import BENCHMARK_PASSWORD, email_for
+
+    # Cada código solo se puede usar una vez, y cada canje lo hace un
+    # representante sin referidor para medir siempre la ampliación de la red
+    redemptions = iter(zip(codes, redeemer_tokens))
+
+    def auth(number):
+        return {"Authorization": f"Bearer {tokens[number % len(tokens)]}"}
+
+    async def token(client, number):
+        return await client.post("/api/representatives/token", data={
+            "username": email_for(number % representative_count),
+            "password": BENCHMARK_PASSWORD,
+        })
+
+    async def dashboard(client, number):
+        return await client.get("/api/representatives/me", headers=auth(number))
+
+    async def products(client, number):
+        return await client.get("/api/products/", headers=auth(number))
+
+    async def use_invitation(client, number):
+        code, token = next(redemptions, ("agotado", tokens[0]))
+        return await client.post(f"/api/invites/use/{code}", headers={"Authorization": f"Bearer {token}"})
+
+    return {
+        "token": token,
+        "dashboard": dashboard,
+        "products": products,
+        "use_invitation": use_invitation,
+    }
+
+
+async def login_all(client, representative_count: int) -> List[str]:
+    from .seed import BENCHMARK_PASSWORD, email_for
+
+    tokens = []
+    for index in range(min(representative_count, 20)):
+        response = await client.post("/api/representatives/token", data={
+            "username": email_for(index),
+            "password": BENCHMARK_PASSWORD,
+        })
+        response.raise_for_status()
+        tokens.append(response.json()["access_token"])
+    return tokens
+
+
+async def run_benchmark(client, args, codes: List[str], redeemer_tokens: List[str]) -> Dict[str, dict]:
+    tokens = await login_all(client, args.representatives)
+    scenarios = build_scenarios(args.representatives, codes, tokens, redeemer_tokens)
+    results = {}
+    for name in [name.strip() for name in args.endpoints.split(",") if name.strip()]:
+        if name not in scenarios:
+            raise SystemExit(f"Endpoint desconocido: {name}")
+        # Una ronda corta de calentamiento para no medir el arranque de conexiones
+        await drive(client, min(10, args.requests), args.concurrency, scenarios[name])
+        results[name] = await drive(client, args.requests, args.concurrency, scenarios[name])
+        print(format_row(name, results[name]))
+    return results
+
+
+def unused_codes() -> List[str]:
+    from sqlalchemy import select
+    from app.database import engine
+    from app.models import Invitation
+
+    with engine.connect() as conn:
+        return list(conn.execute(select(Invitation.code).where(Invitation.is_used == False)).scalars())  # noqa: E712
+
+
+def fresh_redeemer_tokens() -> List[str]:
+    """Tokens de los representantes sembrados para canjear que todavía no tienen referidor"""
+    from sqlalchemy import exists, select
+    from app.database import engine
+    from app.models import ReferralPath, Representative
+    from app.tokens import create_access_token, representative_claims
+
+    referred = exists().where(ReferralPath.descendant_id == Representative.id, ReferralPath.depth == 1)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(Representative.id, Representative.email, Representative.is_active)
+            .where(Representative.email.like("redeemer%"), ~referred)
+            .order_by(Representative.id)
+        ).all()
+    # Se firman aquí, con las mismas claves que el servidor, en vez de iniciar sesión con cada uno
+    return [create_access_token(representative_claims(row)) for row in rows]
+
+
+async def run_inprocess(args, codes, redeemer_tokens):
+    import httpx
+    from app.main import app
+
+    # ASGITransport no emite los eventos de lifespan: se ejecuta a mano
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            return await run_benchmark(client, args, codes, redeemer_tokens)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(args, codes, redeemer_tokens):
+    import httpx
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        env={**os.environ, "DATABASE_URL": args.database_url},
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("uvicorn no arrancó")
+            return await run_benchmark(client, args, codes, redeemer_tokens)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def format_row(name: str, result: dict, baseline: dict = None) -> str:
+    row = (f"{name:<16} {result['requests']:>6} req  {result['throughput_rps']:>9.1f} req/s  "
+           f"p50 {result['p50_ms']:>8.2f}  p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  "
+           f"{result['statuses']}")
+    if baseline:
+        change = (result["p95_ms"] - baseline["p95_ms"]) / baseline["p95_ms"] * 100 if baseline["p95_ms"] else 0.0
+        row += f"  p95 {change:+.1f}% vs baseline"
+    return row
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # La URL debe fijarse antes de importar `app`; el benchmark de login no debe chocar con el límite de tasa
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    from .seed import SeedConfig, seed_database
+
+    if not args.no_seed:
+        print(f"Sembrando {args.database_url} ...")
+        seed_database(SeedConfig(
+            representatives=args.representatives,
+            children=args.children,
+            products=args.products,
+            invitations=args.invitations,
+            # Un representante por canje, calentamiento incluido
+            redeemers=args.requests + min(10, args.requests),
+        ))
+    codes = unused_codes()
+    redeemer_tokens = fresh_redeemer_tokens()
+
+    runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    results = asyncio.run(runner(args, codes, redeemer_tokens))
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        print("\nComparación con la línea base:")
+        for name, result in results.items():
+            print(format_row(name, result, baseline.get(name)))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
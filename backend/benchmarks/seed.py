@@ -0,0 +1,125 @@
+"""
+Carga datos sintéticos para los benchmarks.
+
+Se importa después de fijar DATABASE_URL, porque `app.database` crea los
+engines al importarse.
+"""
+import random
+import secrets
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+
+from app.auth import get_password_hash
+from app.database import Base, engine
+from app.migrations import schema_migrations, upgrade
+from app.models import Child, Invitation, Product, Representative
+from app.search import rebuild_search_index
+from app.stats import rebuild_stats
+
+BENCHMARK_PASSWORD = "benchmark"
+CHUNK_SIZE = 5000
+
+
+@dataclass
+class SeedConfig:
+    representatives: int = 10
+    children: int = 3
+    products: int = 200
+    invitations: int = 50
+    # Representantes sin referidor que canjean las invitaciones (uno por canje)
+    redeemers: int = 0
+    seed: int = 42
+
+
+def _insert(conn, model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(insert(model), rows[start:start + CHUNK_SIZE])
+
+
+def email_for(index: int) -> str:
+    return f"bench{index}@example.com"
+
+
+def redeemer_email_for(index: int) -> str:
+    return f"redeemer{index}@example.com"
+
+
+def seed_database(config: SeedConfig, reset: bool = True):
+    """
+    Crea `representatives` representantes y, para cada uno, la cantidad
+    indicada de hijos, productos e invitaciones sin usar, más `redeemers`
+    representantes sin datos para canjear las invitaciones. Todos comparten
+    la contraseña BENCHMARK_PASSWORD (el hash se calcula una sola vez).
+    """
+    rng = random.Random(config.seed)
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+        schema_migrations.drop(engine, checkfirst=True)
+        with engine.begin() as conn:
+            # La tabla FTS5 de SQLite no está en el modelo (la crea la migración 0001)
+            conn.exec_driver_sql("DROP TABLE IF EXISTS product_search")
+    upgrade(engine)
+
+    hashed_password = get_password_hash(BENCHMARK_PASSWORD)
+    today = date.today()
+
+    def representative(name: str, email: str) -> dict:
+        return {
+            "full_name": name,
+            "birth_date": date(1980, 1, 1) + timedelta(days=rng.randrange(10000)),
+            "country": "Colombia",
+            "email": email,
+            "phone": None,
+            "hashed_password": hashed_password,
+            "is_active": True,
+        }
+
+    with engine.begin() as conn:
+        _insert(conn, Representative, [
+            representative(f"Representante {index}", email_for(index)) for index in range(config.representatives)
+        ])
+        ids = [row.id for row in conn.execute(Representative.__table__.select().order_by(Representative.id))]
+        _insert(conn, Representative, [
+            representative(f"Invitado {index}", redeemer_email_for(index)) for index in range(config.redeemers)
+        ])
+
+        children, products, invitations = [], [], []
+        for representative_id in ids:
+            children.extend(
+                {
+                    "full_name": f"Hijo {representative_id}-{index}",
+                    "birth_date": date(2010, 1, 1) + timedelta(days=rng.randrange(3000)),
+                    "country": "Colombia",
+                    "representative_id": representative_id,
+                }
+                for index in range(config.children)
+            )
+            products.extend(
+                {
+                    "name": f"Producto {rng.randrange(100000):05d}",
+                    "description": "Producto generado para benchmarks",
+                    "price": round(rng.uniform(1, 500), 2),
+                    "stock": rng.randrange(1, 20),
+                    "is_active": rng.random() > 0.1,
+                    "representative_id": representative_id,
+                }
+                for _ in range(config.products)
+            )
+            invitations.extend(
+                {
+                    "code": secrets.token_urlsafe(8),
+                    "is_used": False,
+                    "created_at": today,
+                    "sender_id": representative_id,
+                }
+                for _ in range(config.invitations)
+            )
+        _insert(conn, Child, children)
+        _insert(conn, Product, products)
+        _insert(conn, Invitation, invitations)
+        # Los inserts masivos no pasan por las rutas: índice de búsqueda y totales se recalculan
+        rebuild_search_index(conn)
+        rebuild_stats(conn)
+    return ids
@@ -0,0 +1,120 @@
+"""
+Benchmark de serialización de listas: camino actual frente al modo rápido.
+
+Uso (desde backend/):
+
+    python -m benchmarks.serialization --items 1000 --repeat 50
+
+Compara, para la misma lista de productos, el camino basado en los
+esquemas de `app.schemas` (objetos ORM → validación `from_attributes` →
+jsonable_encoder → json) con las alternativas sin validación: TypeAdapter,
+`model_construct` y tuplas convertidas a dicts y codificadas con orjson
+(lo que hace FAST_RESPONSES). No usa la base de datos.
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models import Product
+from app.responses import orjson
+from app.schemas import ProductResponse
+
+FIELDS = list(ProductResponse.model_fields)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000, help="Elementos por lista")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados")
+    return parser.parse_args(argv)
+
+
+def make_rows(count: int, seed: int = 42) -> List[tuple]:
+    rng = random.Random(seed)
+    return [
+        tuple({
+            "id": index,
+            "name": f"Producto {rng.randrange(100000):05d}",
+            "description": "Producto generado para benchmarks",
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.randrange(1, 20),
+            "is_active": rng.random() > 0.1,
+            "representative_id": 1,
+        }[field] for field in FIELDS)
+        for index in range(1, count + 1)
+    ]
+
+
+def build_cases(rows: List[tuple]) -> Dict[str, Callable[[], bytes]]:
+    objects = [Product(**dict(zip(FIELDS, row))) for row in rows]
+    adapter = TypeAdapter(List[ProductResponse])
+
+    def current():
+        items = [ProductResponse.model_validate(obj) for obj in objects]
+        return json.dumps(jsonable_encoder(items)).encode()
+
+    def type_adapter():
+        return adapter.dump_json(objects, warnings=False)
+
+    def model_construct():
+        items = [ProductResponse.model_construct(**dict(zip(FIELDS, row))) for row in rows]
+        return json.dumps(jsonable_encoder(items)).encode()
+
+    def tuples_json():
+        return json.dumps(jsonable_encoder([dict(zip(FIELDS, row)) for row in rows])).encode()
+
+    cases = {
+        "current": current,
+        "type_adapter": type_adapter,
+        "model_construct": model_construct,
+        "tuples_json": tuples_json,
+    }
+    if orjson is not None:
+        cases["tuples_orjson"] = lambda: orjson.dumps([dict(zip(FIELDS, row)) for row in rows])
+    return cases
+
+
+def measure(function: Callable[[], bytes], repeat: int) -> dict:
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "median_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "min_ms": round(timings[0] * 1000, 3),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = make_rows(args.items)
+    cases = build_cases(rows)
+
+    # Todas las variantes deben producir el mismo JSON
+    expected = json.loads(cases["current"]())
+    for name, function in cases.items():
+        assert json.loads(function()) == expected, f"{name} produce un resultado distinto"
+
+    results = {name: measure(function, args.repeat) for name, function in cases.items()}
+    baseline = results["current"]["median_ms"]
+    for name, result in results.items():
+        speedup = baseline / result["median_ms"] if result["median_ms"] else 0.0
+        print(f"{name:<16} {args.items:>6} items  mediana {result['median_ms']:>9.3f} ms  "
+              f"mín {result['min_ms']:>9.3f} ms  x{speedup:.1f}")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"config": vars(args), "results": results}, output_file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()